@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for venv_tools.
+
+Times creating and removing venvs, activating and deactivating them,
+`is_venv`, calling python within a venv, and installing a package from a
+local wheel. No network access is needed. The results are written as JSON,
+so runs from different releases can be compared:
+
+.. code-block :: shell
+
+    python benchmarks/bench_venv_tools.py --output results.json
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import argparse
+import datetime
+import json
+import os.path as pth
+import platform
+from shlex import quote
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import venv_tools
+from venv_tools import Venv, TemporaryVenv, BackgroundTeardown
+from venv_tools._utils import (
+    get_default_venv_builder, is_venv, clear_venv_cache,
+)
+
+sys.path.insert(0, pth.join(pth.dirname(pth.abspath(__file__)), "..", "tests"))
+from wheels import make_wheel  # pylint: disable=wrong-import-position
+
+WHEEL_NAME = "venv_tools_bench_pkg"
+WHEEL_VERSION = "1.0"
+INSTALL_COMMAND = (
+    "{{python}} -m pip install --no-index --find-links {find_links} "
+    "--force-reinstall --no-deps '{{package}}'"
+)
+
+
+def timed(func, repeat, setup=None, teardown=None):
+    """
+    Call `func` `repeat` times, returning statistics of the times taken in
+    seconds. `setup` is called before each call, and its result passed to
+    `func` and `teardown`, neither of which are timed.
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        result = func(arg) if setup is not None else func()
+        times.append(time.perf_counter() - start)
+        if teardown is not None:
+            teardown(result if setup is None else arg)
+    return {
+        "repeat": repeat,
+        "min": min(times),
+        "max": max(times),
+        "mean": statistics.mean(times),
+        "median": statistics.median(times),
+        "times": times,
+    }
+
+
+def builder_name(builder):
+    return "{}.{}".format(builder.__module__, builder.__qualname__)
+
+
+def bench_create(results, repeat):
+    """
+    Create and remove venvs with each of the default builders, and with
+    `TemporaryVenv`.
+    """
+    builders = []
+    for use_virtualenv in (False, True):
+        builder = get_default_venv_builder(use_virtualenv, None)
+        if builder not in builders:
+            builders.append(builder)
+
+    for builder in builders:
+        name = builder_name(builder)
+
+        def create(env_dir, builder=builder):
+            builder(clear=True).create(env_dir)
+            return env_dir
+
+        results["create[{}]".format(name)] = timed(
+            create, repeat, setup=tempfile.mkdtemp, teardown=shutil.rmtree,
+        )
+        results["teardown[{}]".format(name)] = timed(
+            shutil.rmtree, repeat,
+            setup=lambda builder=builder: create(tempfile.mkdtemp(), builder),
+        )
+
+    temp_venv = TemporaryVenv()
+    results["TemporaryVenv.__enter__"] = timed(
+        temp_venv.__enter__, repeat,
+        teardown=lambda env_dir: temp_venv.__exit__(None, None, None),
+    )
+
+    results["TemporaryVenv.__exit__"] = timed(
+        lambda env_dir: temp_venv.__exit__(None, None, None), repeat,
+        setup=temp_venv.__enter__,
+    )
+
+    with BackgroundTeardown() as teardown:
+        temp_venv = TemporaryVenv(teardown=teardown)
+        results["TemporaryVenv.__exit__[background]"] = timed(
+            lambda env_dir: temp_venv.__exit__(None, None, None), repeat,
+            setup=temp_venv.__enter__,
+        )
+
+
+def bench_venv(results, repeat, env_dir, wheel_dir):
+    """
+    Time operations on an existing venv.
+    """
+    venv = Venv(env_dir)
+
+    def cycle():
+        with venv:
+            pass
+
+    results["Venv.__enter__/__exit__"] = timed(cycle, repeat)
+
+    not_venv = tempfile.mkdtemp()
+    try:
+        results["is_venv[hit]"] = timed(
+            lambda: is_venv(env_dir), repeat,
+        )
+        results["is_venv[miss]"] = timed(
+            lambda: is_venv(not_venv), repeat,
+        )
+        results["is_venv[uncached]"] = timed(
+            lambda arg: is_venv(env_dir), repeat, setup=clear_venv_cache,
+        )
+    finally:
+        shutil.rmtree(not_venv)
+
+    script = pth.join(wheel_dir, "bench_script.py")
+    with open(script, "w") as f:
+        f.write("import sys\n")
+    results["call_python_code"] = timed(
+        lambda: venv.call_python_code("import sys"), repeat,
+    )
+    results["call_python_module"] = timed(
+        lambda: venv.call_python_module("site"), repeat,
+    )
+    results["call_python_file"] = timed(
+        lambda: venv.call_python_file(script), repeat,
+    )
+
+    results["Venv.distributions"] = timed(venv.distributions, repeat)
+
+    venv.install_command = INSTALL_COMMAND.format(find_links=quote(wheel_dir))
+    results["install_package"] = timed(
+        lambda: venv.install_package(WHEEL_NAME), repeat,
+    )
+
+
+def run(repeat):
+    """
+    Run all the benchmarks, returning the results.
+    """
+    benchmarks = {}
+    bench_create(benchmarks, repeat)
+
+    wheel_dir = tempfile.mkdtemp()
+    try:
+        make_wheel(wheel_dir, WHEEL_NAME, WHEEL_VERSION)
+        with TemporaryVenv(with_pip=True) as env_dir:
+            bench_venv(benchmarks, repeat, env_dir, wheel_dir)
+    finally:
+        shutil.rmtree(wheel_dir)
+
+    return {
+        "venv_tools_version": venv_tools.__version__,
+        "python_version": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.utcnow().isoformat() + "Z",
+        "repeat": repeat,
+        "benchmarks": benchmarks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="the number of times to run each benchmark",
+    )
+    parser.add_argument(
+        "--output", default="-",
+        help="the file to write the JSON results to (default: stdout)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    for name, stats in sorted(results["benchmarks"].items()):
+        sys.stderr.write("{:<55} {:.6f}s\n".format(name, stats["median"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
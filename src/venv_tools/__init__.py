@@ -8,26 +8,101 @@ A bunch of tools for using venvs (and virtualenvs) from python.
 :copyright: (c) 2014 by James Tocknell.
 :license: BSD, see LICENSE for more details.
 """
+from importlib import import_module
 from logging import getLogger
 import os
 import os.path
-import tempfile
-import shutil
-from shlex import split
-import subprocess
+import sys
+import threading
 import warnings
+import weakref
 
 from ._utils import (
     pathprepend, get_default_venv_builder, is_venv, BIN_DIR, PYTHON_FILENAME,
-    abspath_python_exe, run_python_with_args
+    PYVENV_FILENAME,
+    abspath_python_exe, run_python_with_args, parse_pip_install_output,
+    InstallResult, DEFAULT_INSTALL_COMMAND, DEFAULT_BATCH_INSTALL_COMMAND,
+    stream_python_with_args, venv_environ, select_temp_dir, TMPFS_DIR,
+    DEFAULT_UNINSTALL_COMMAND, PROTECTED_DISTRIBUTIONS, SyncResult,
+    requirement_pin, strip_requirement_comment, canonicalize_name,
 )
+from ._config import PyvenvConfig, read_pyvenv_cfg
+from ._events import (
+    Event, add_listener, remove_listener, qualified_name, record,
+)
+
+# Names which are only imported when first used, as their modules (and the
+# modules they depend on, such as asyncio) are slow to import
+_LAZY_ATTRIBUTES = {
+    "AsyncVenv": "._async",
+    "AsyncTemporaryVenv": "._async",
+    "find_venvs": "._find",
+    "VenvGroup": "._group",
+    "GroupResult": "._group",
+    "InterpreterInfo": "._interpreter",
+    "get_interpreter_info": "._interpreter",
+    "Metrics": "._metrics",
+    "VenvStore": "._store",
+    "BackgroundTeardown": "._teardown",
+    "Distribution": "._dists",
+    "TraceRecorder": "._trace",
+    "TemplateCache": "._templates",
+    "VenvWorker": "._worker",
+    "VenvWorkerPool": "._worker",
+    "VenvZygote": "._worker",
+    "WorkerCompletedProcess": "._worker",
+}
+
+
+def _get_version():
+    """
+    Find the version from the installed package metadata, only falling back
+    to versioneer (which may need to run git) if the package is not
+    installed.
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        pass
+    else:
+        try:
+            return version(__name__)
+        except PackageNotFoundError:
+            pass
+    # pylint: disable=import-outside-toplevel
+    from ._version import get_versions
+    return get_versions()['version']
+
+
+def __getattr__(name):
+    if name == "__version__":
+        value = _get_version()
+    elif name in _LAZY_ATTRIBUTES:
+        module = import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+    else:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name)
+        )
+    globals()[name] = value
+    return value
 
-from ._version import get_versions
-__version__ = get_versions()['version']
-del get_versions
 
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | {"__version__"})
+
+
+__all__ = [
+    "Venv", "TemporaryVenv", "TemporaryVenvPool", "TemplateCache", "VenvStore",
+    "InstallResult", "VenvWorker", "VenvWorkerPool", "VenvZygote",
+    "WorkerCompletedProcess", "AsyncVenv", "AsyncTemporaryVenv", "VenvGroup",
+    "GroupResult", "find_venvs", "PyvenvConfig", "InterpreterInfo",
+    "get_interpreter_info", "Event", "add_listener", "remove_listener",
+    "TraceRecorder", "Metrics", "BackgroundTeardown", "SyncResult",
+    "Distribution",
+]
 
-DEFAULT_INSTALL_COMMAND = "{python} -m pip install '{package}'"
 log = getLogger(__name__)
 
 
@@ -59,6 +134,8 @@ class Venv(object):
         self._venv_builder = venv_builder
         self._kwargs = kwargs
         self._install_command = DEFAULT_INSTALL_COMMAND
+        self._batch_install_command = DEFAULT_BATCH_INSTALL_COMMAND
+        self._uninstall_command = DEFAULT_UNINSTALL_COMMAND
         self._old_venv = None
         self._python_home = None
         self._old_path = None
@@ -101,6 +178,41 @@ class Venv(object):
         """
         return os.path.join(self.env_dir, BIN_DIR, PYTHON_FILENAME)
 
+    @property
+    def pyvenv_cfg(self):
+        """
+        The contents of the venv's `pyvenv.cfg` as a `PyvenvConfig`, or
+        `None` if it does not have one (as with older virtualenvs). This gives
+        details of the base interpreter without running python.
+        """
+        try:
+            return read_pyvenv_cfg(os.path.join(self.env_dir, PYVENV_FILENAME))
+        except FileNotFoundError:
+            return None
+
+    @property
+    def interpreter_info(self):
+        """
+        Details of the venv's python interpreter as an `InterpreterInfo`.
+        This is cached, so the interpreter is only run the first time this
+        is used for a venv.
+        """
+        # pylint: disable=import-outside-toplevel
+        from ._interpreter import get_interpreter_info
+        return get_interpreter_info(self.python_exe)
+
+    def environ(self, base=None):
+        """
+        Return a copy of the environment `base` (by default `os.environ`) with
+        this venv activated. Unlike using `Venv` as a context manager, this
+        does not modify the environment of the current process, so is safe to
+        use from multiple threads.
+
+        Subprocesses started by the methods of `Venv` are given this
+        environment, unless an `env` keyword is given.
+        """
+        return venv_environ(self.env_dir, base)
+
     @property
     def env_dir(self):
         """
@@ -120,11 +232,38 @@ class Venv(object):
     def install_command(self, new_cmd):
         self._install_command = new_cmd
 
+    @property
+    def batch_install_command(self):
+        """
+        The command to install multiple python packages in the virtualenv.
+        Must be a format string with python, and the requirements to install
+        are added as extra arguments.
+        """
+        return self._batch_install_command
+
+    @batch_install_command.setter
+    def batch_install_command(self, new_cmd):
+        self._batch_install_command = new_cmd
+
+    @property
+    def uninstall_command(self):
+        """
+        The command to uninstall python packages from the virtualenv. Must be
+        a format string with python, and the names of the distributions to
+        uninstall are added as extra arguments.
+        """
+        return self._uninstall_command
+
+    @uninstall_command.setter
+    def uninstall_command(self, new_cmd):
+        self._uninstall_command = new_cmd
+
     def call_python_file(self, filename, *args, **kwargs):
         """
         Call a python file with the python interpreter associated with this
         virtualenv.
         """
+        kwargs.setdefault("env", self.environ())
         return run_python_with_args(
             python_exe=self.python_exe, script=filename, args=args, **kwargs
         )
@@ -134,6 +273,7 @@ class Venv(object):
         Call a python module with the python interpreter associated with this
         virtualenv.
         """
+        kwargs.setdefault("env", self.environ())
         return run_python_with_args(
             python_exe=self.python_exe, module=module_name, args=args, **kwargs
         )
@@ -143,20 +283,258 @@ class Venv(object):
         Call some python code with the python interpreter associated with this
         virtualenv.
         """
+        kwargs.setdefault("env", self.environ())
         return run_python_with_args(
             python_exe=self.python_exe, code=code, args=args, **kwargs
         )
 
+    def stream_python_file(self, filename, *args, **kwargs):
+        """
+        Call a python file with the python interpreter associated with this
+        virtualenv, yielding `(stream, line)` for each line of output as it
+        is written, where `stream` is "stdout" or "stderr".
+        """
+        kwargs.setdefault("env", self.environ())
+        return stream_python_with_args(
+            python_exe=self.python_exe, script=filename, args=args, **kwargs
+        )
+
+    def stream_python_module(self, module_name, *args, **kwargs):
+        """
+        Call a python module with the python interpreter associated with this
+        virtualenv, yielding `(stream, line)` for each line of output as it
+        is written, where `stream` is "stdout" or "stderr".
+        """
+        kwargs.setdefault("env", self.environ())
+        return stream_python_with_args(
+            python_exe=self.python_exe, module=module_name, args=args, **kwargs
+        )
+
+    def stream_python_code(self, code, *args, **kwargs):
+        """
+        Call some python code with the python interpreter associated with this
+        virtualenv, yielding `(stream, line)` for each line of output as it
+        is written, where `stream` is "stdout" or "stderr".
+        """
+        kwargs.setdefault("env", self.environ())
+        return stream_python_with_args(
+            python_exe=self.python_exe, code=code, args=args, **kwargs
+        )
+
+    def worker(self):
+        """
+        A `VenvWorker` using the python interpreter associated with this
+        virtualenv. Use it as a context manager to run many calls in the
+        same interpreter:
+
+        .. code-block :: python
+
+            with venv.worker() as worker:
+                worker.call_python_code("import sys; print(sys.prefix)")
+        """
+        # pylint: disable=import-outside-toplevel
+        from ._worker import VenvWorker
+        return VenvWorker(self.python_exe, env=self.environ())
+
+    def zygote(self, preload=()):
+        """
+        A `VenvZygote` using the python interpreter associated with this
+        virtualenv, which imports `preload` once and then forks a child for
+        each call.
+        """
+        # pylint: disable=import-outside-toplevel
+        from ._worker import VenvZygote
+        return VenvZygote(
+            self.python_exe, preload=preload, env=self.environ()
+        )
+
+    def worker_pool(self, size=None, max_tasks_per_child=None, max_rss=None):
+        """
+        A `VenvWorkerPool` using the python interpreter associated with this
+        virtualenv, which spreads calls across `size` interpreters. Workers
+        are restarted after `max_tasks_per_child` calls, or once their
+        resident memory exceeds `max_rss` bytes.
+        """
+        # pylint: disable=import-outside-toplevel
+        from ._worker import VenvWorkerPool
+        return VenvWorkerPool(
+            self.python_exe, size=size,
+            max_tasks_per_child=max_tasks_per_child, max_rss=max_rss,
+            env=self.environ(),
+        )
+
     def install_package(self, package):
         """
         Install a python package into this virtualenv.
         """
+        # pylint: disable=import-outside-toplevel
+        from shlex import split
+        import subprocess
         cmd = split(
             self.install_command.format(
                 python=self.python_exe, package=package
             )
         )
-        return subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+        with record("install", cmd, self.env_dir) as recorder:
+            output = subprocess.check_output(
+                cmd, stderr=subprocess.STDOUT, env=self.environ()
+            )
+            recorder.set_result(0, output)
+        return output
+
+    def install_packages(
+        self, packages, constraints=None, requirements_files=None
+    ):
+        """
+        Install multiple python packages into this virtualenv, using a single
+        call to pip so that all the packages are resolved together.
+
+        :param packages: The requirements to install.
+        :param constraints: Constraints to apply to the install, in the format
+            of a pip constraints file.
+        :param requirements_files: Paths to requirements files to install.
+
+        :return: An `InstallResult` for each of `packages`.
+        """
+        # pylint: disable=import-outside-toplevel
+        from shlex import split
+        import subprocess
+        import tempfile
+        packages = list(packages)
+        cmd = split(self.batch_install_command.format(python=self.python_exe))
+        for requirements_file in requirements_files or ():
+            cmd.extend(["-r", requirements_file])
+        constraints_file = None
+        try:
+            if constraints:
+                with tempfile.NamedTemporaryFile(
+                    "w", suffix=".txt", delete=False
+                ) as constraints_file:
+                    constraints_file.write("\n".join(constraints) + "\n")
+                cmd.extend(["-c", constraints_file.name])
+            cmd.extend(packages)
+            log.debug("Running command %s", cmd)
+            with record("install", cmd, self.env_dir) as recorder:
+                output = subprocess.check_output(
+                    cmd, stderr=subprocess.STDOUT, universal_newlines=True,
+                    env=self.environ()
+                )
+                recorder.set_result(0, output)
+        finally:
+            if constraints_file is not None:
+                os.remove(constraints_file.name)
+        return parse_pip_install_output(output, packages)
+
+    def uninstall_packages(self, names):
+        """
+        Uninstall the distributions `names` from this virtualenv, using a
+        single call to pip.
+        """
+        # pylint: disable=import-outside-toplevel
+        from shlex import split
+        import subprocess
+        cmd = split(self.uninstall_command.format(python=self.python_exe))
+        cmd.extend(names)
+        log.debug("Running command %s", cmd)
+        with record("uninstall", cmd, self.env_dir) as recorder:
+            output = subprocess.check_output(
+                cmd, stderr=subprocess.STDOUT, universal_newlines=True,
+                env=self.environ()
+            )
+            recorder.set_result(0, output)
+        return output
+
+    def distributions(self):
+        """
+        The distributions installed in this virtualenv, as a list of
+        `Distribution`. This reads the metadata in the virtualenv's
+        `site-packages` directly rather than running python, and is cached
+        until a distribution is installed or removed. Distributions from the
+        system `site-packages` are not included.
+        """
+        # pylint: disable=import-outside-toplevel
+        from ._dists import read_distributions, site_packages_dirs
+        dists = []
+        for site_dir in site_packages_dirs(self.env_dir):
+            dists.extend(read_distributions(site_dir))
+        return dists
+
+    def sync(self, requirements, remove_extras=True, protected=None):
+        """
+        Make the installed distributions (as found by `distributions`) match
+        `requirements`, only installing those which are missing or at a
+        different version, and uninstalling any distributions which are not
+        required.
+
+        Requirements pinned to a version (`name==version`, or a wheel) are
+        installed if a different version is installed; other requirements
+        are only installed if nothing of that name is installed. As any
+        installed distribution not in `requirements` is removed,
+        `requirements` should be the complete set (such as the output of
+        `pip freeze`). The install and the uninstall are each done in a
+        single call to pip, installing first so nothing is removed if the
+        install fails.
+
+        :param requirements: The requirements, in any form accepted by pip
+            which includes the project name, such as the lines of a
+            requirements file. Blank lines and comments are ignored, but pip
+            options (such as ``-e`` or ``--index-url``) are not supported;
+            options for pip can be set in `batch_install_command` instead.
+        :param bool remove_extras: Uninstall distributions which are not in
+            `requirements`.
+        :param protected: Names of distributions which are never uninstalled.
+            Defaults to `PROTECTED_DISTRIBUTIONS` (pip, setuptools, wheel and
+            the like).
+
+        :return: A `SyncResult`.
+        """
+        if protected is None:
+            protected = PROTECTED_DISTRIBUTIONS
+        protected = {canonicalize_name(name) for name in protected}
+        installed = {
+            canonicalize_name(dist.name): dist.version
+            for dist in self.distributions()
+        }
+
+        wanted = set()
+        to_install = []
+        unchanged = []
+        for requirement in requirements:
+            requirement = strip_requirement_comment(requirement)
+            if not requirement:
+                continue
+            if requirement.startswith("-"):
+                raise RuntimeError(
+                    "Cannot sync {}, pip options are not supported.".format(
+                        requirement
+                    )
+                )
+            name, version = requirement_pin(requirement)
+            if name is None:
+                raise RuntimeError(
+                    "Cannot find the name of {}, use 'name @ url'.".format(
+                        requirement
+                    )
+                )
+            wanted.add(name)
+            if name in installed and version in (None, installed[name]):
+                unchanged.append(name)
+            else:
+                to_install.append(requirement)
+
+        results = []
+        if to_install:
+            results = self.install_packages(to_install)
+        removed = []
+        if remove_extras:
+            removed = sorted(set(installed) - wanted - protected)
+        if removed:
+            self.uninstall_packages(removed)
+        log.debug(
+            "Synced %s: %d installed, %d removed, %d unchanged",
+            self.env_dir, len(results), len(removed), len(unchanged)
+        )
+        return SyncResult(results, removed, unchanged)
 
 
 class TemporaryVenv(object):
@@ -196,11 +574,33 @@ class TemporaryVenv(object):
         method `create` which takes one argument, `env_dir`, and creates a venv
         at that path. Any additional keywords passed to `Venv` will be passed
         to the object.
+    :param template_cache: If given, the venv is cloned from a template
+        stored in the cache (which is built on first use) rather than being
+        created from scratch.
+    :param teardown: If given, the venv is moved aside on exit and deleted
+        in the background, rather than being deleted before exit returns.
+    :param dir: The directory to create the venv in, or a list of
+        candidate directories. The first candidate which can be written to,
+        allows executables to be run and has at least `min_free_space` bytes
+        free is used, falling back to the default temporary directory if
+        none are suitable.
+    :param str prefix: The prefix of the name of the venv's directory.
+    :param str suffix: The suffix of the name of the venv's directory.
+    :param int min_free_space: The space in bytes the venv is expected to
+        need, used when choosing between candidate directories.
+    :param bool use_tmpfs: Try to create the venv in memory in `/dev/shm`
+        first, before the other candidates (if it has enough free space).
 
     :type venv_builder: `venv.EnvBuilder or similar`
+    :type template_cache: `TemplateCache`
+    :type teardown: `BackgroundTeardown`
+    :type dir: `str or list of str`
     """
     def __init__(
         self, venv_builder=None, use_virtualenv=False, python_exe=None,
+        template_cache=None, teardown=None,
+        dir=None,  # pylint: disable=redefined-builtin
+        prefix=None, suffix=None, min_free_space=None, use_tmpfs=False,
         **kwargs
     ):
         path_to_python_exe = abspath_python_exe(python_exe)
@@ -210,18 +610,235 @@ class TemporaryVenv(object):
             use_virtualenv, path_to_python_exe,
         )
         self._path_to_python_exe = path_to_python_exe
+        self._template_cache = template_cache
+        self._teardown = teardown
+        self._dir = dir
+        self._prefix = prefix
+        self._suffix = suffix
+        self._min_free_space = min_free_space
+        self._use_tmpfs = use_tmpfs
         self.env_dir = None
 
         # needed for venv which wants to create dir
         self._kwargs["clear"] = True
 
-    def __enter__(self):
-        self.env_dir = tempfile.mkdtemp()
+    def _select_dir(self):
+        """
+        The directory to create the next venv in, or `None` for the default
+        temporary directory.
+        """
+        if isinstance(self._dir, str) and not self._use_tmpfs:
+            return self._dir
+        if self._dir is None:
+            candidates = []
+        elif isinstance(self._dir, str):
+            candidates = [self._dir]
+        else:
+            candidates = list(self._dir)
+        if self._use_tmpfs:
+            candidates.insert(0, TMPFS_DIR)
+        if not candidates:
+            return None
+        selected = select_temp_dir(candidates, self._min_free_space)
+        if selected is None:
+            log.debug("None of %s are suitable, using the default", candidates)
+        return selected
+
+    def _make_dir(self):
+        """
+        Make the empty directory for a new temporary venv, returning its
+        path.
+        """
+        import tempfile  # pylint: disable=import-outside-toplevel
+        return tempfile.mkdtemp(
+            suffix=self._suffix, prefix=self._prefix, dir=self._select_dir()
+        )
+
+    def _builder_kwargs(self):
+        """
+        The keywords to pass to the venv builder.
+        """
+        kwargs = dict(self._kwargs)
         if self._path_to_python_exe:
-            self._kwargs["path_to_python_exe"] = self._path_to_python_exe
-        venv = self._venv_builder(**self._kwargs)
-        venv.create(self.env_dir)
+            kwargs["path_to_python_exe"] = self._path_to_python_exe
+        return kwargs
+
+    def _record_create(self, env_dir):
+        """
+        Return a context manager which emits the event for creating the venv
+        at `env_dir`.
+        """
+        return record("create", env_dir=env_dir, details={
+            "builder": qualified_name(self._venv_builder),
+            "source": "temporary",
+        })
+
+    def _build(self, env_dir):
+        """
+        Create a venv in the empty directory `env_dir`, cloning it from the
+        template cache if there is one.
+        """
+        kwargs = self._builder_kwargs()
+        if self._template_cache is not None:
+            self._template_cache.clone(
+                self._venv_builder, self._path_to_python_exe, kwargs, env_dir
+            )
+        else:
+            venv = self._venv_builder(**kwargs)
+            venv.create(env_dir)
+
+    def _create(self):
+        """
+        Create a new temporary venv, returning the path to it.
+        """
+        env_dir = self._make_dir()
+        with self._record_create(env_dir):
+            self._build(env_dir)
+        return env_dir
+
+    @property
+    def teardown(self):
+        """
+        The `BackgroundTeardown` used to remove venvs, or `None` if they are
+        removed immediately.
+        """
+        return self._teardown
+
+    def _delete(self, env_dir, background=True):
+        """
+        Remove the temporary venv at `env_dir`, in the background if there
+        is a `teardown` and `background` is true.
+        """
+        with record("delete", env_dir=env_dir):
+            if background and self._teardown is not None:
+                self._teardown.remove(env_dir)
+            else:
+                import shutil  # pylint: disable=import-outside-toplevel
+                shutil.rmtree(env_dir)
+
+    def __enter__(self):
+        self.env_dir = self._create()
         return self.env_dir
 
     def __exit__(self, exc_type, exc_value, traceback):
-        shutil.rmtree(self.env_dir)
+        self._delete(self.env_dir)
+
+
+def _close_pool(creator, ready, teardown):
+    """
+    Stop `creator` making venvs for a `TemporaryVenvPool`, remove the unused
+    venvs in `ready`, and close `teardown` if it is given. This is run when
+    the pool is closed, garbage collected or python exits, so it must not
+    refer to the pool.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ._teardown import remove_tree
+    # the pool may be garbage collected in one of creator's threads, which
+    # cannot join itself, so wait for each venv below instead
+    creator.shutdown(wait=False)
+    while not ready.empty():
+        future = ready.get_nowait()
+        if future.exception() is None:
+            env_dir = future.result()
+            with record("delete", env_dir=env_dir):
+                remove_tree(env_dir)
+    if teardown is not None:
+        teardown.close()
+
+
+class TemporaryVenvPool(TemporaryVenv):
+    """
+    A `TemporaryVenv` which keeps a number of venvs ready for use.
+
+    Venvs are created in the background, so entering the context manager
+    only needs to wait if all the ready venvs have been used. Each venv
+    taken from the pool is replaced by a new one, and venvs are removed in
+    the background on exit (using a new `BackgroundTeardown` if `teardown`
+    is not given). The same pool can be entered multiple times (including
+    from different threads), with each entry getting its own venv.
+
+    Apart from `size`, the arguments are the same as for `TemporaryVenv`.
+    Call `close` when the pool is no longer needed to remove any unused
+    venvs; otherwise they are removed when the pool is garbage collected or
+    python exits.
+
+    :param int size: The number of venvs to keep ready.
+    """
+    def __init__(
+        self, size=1, venv_builder=None, use_virtualenv=False,
+        python_exe=None, template_cache=None, teardown=None, **kwargs
+    ):
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ThreadPoolExecutor
+        import queue
+        from ._teardown import BackgroundTeardown
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self._owns_teardown = teardown is None
+        if teardown is None:
+            teardown = BackgroundTeardown()
+        super().__init__(
+            venv_builder=venv_builder, use_virtualenv=use_virtualenv,
+            python_exe=python_exe, template_cache=template_cache,
+            teardown=teardown, **kwargs
+        )
+        self._size = size
+        self._ready = queue.Queue()
+        self._local = threading.local()
+        self._closed = False
+        self._creator = ThreadPoolExecutor(max_workers=size)
+        for _ in range(size):
+            self._refill()
+        self._finalizer = weakref.finalize(
+            self, _close_pool, self._creator, self._ready,
+            teardown if self._owns_teardown else None
+        )
+
+    @property
+    def size(self):
+        """
+        The number of venvs kept ready
+        """
+        return self._size
+
+    def _refill(self):
+        self._ready.put(self._creator.submit(self._create))
+
+    def _in_use(self):
+        if not hasattr(self._local, "env_dirs"):
+            self._local.env_dirs = []
+        return self._local.env_dirs
+
+    def __enter__(self):
+        if self._closed:
+            raise RuntimeError("TemporaryVenvPool has been closed.")
+        future = self._ready.get()
+        self._refill()
+        self.env_dir = future.result()
+        self._in_use().append(self.env_dir)
+        return self.env_dir
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        env_dir = self._in_use().pop()
+        # a teardown created by the pool has been closed along with it
+        self._delete(
+            env_dir, background=not (self._closed and self._owns_teardown)
+        )
+
+    def close(self):
+        """
+        Stop creating venvs, and remove any venvs which have not been used.
+        Venvs which are still in use are not removed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._finalizer()
+
+
+# module __getattr__ needs python 3.7, and some of the lazy modules use the
+# classes above
+if sys.version_info < (3, 7):
+    for _name in list(_LAZY_ATTRIBUTES) + ["__version__"]:
+        __getattr__(_name)
+    del _name
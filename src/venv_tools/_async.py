@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._async
+~~~~~~~~~~
+
+asyncio versions of the venv tools, which run subprocesses without blocking
+the event loop.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import asyncio
+import locale
+from logging import getLogger
+import os.path as pth
+import shutil
+from shlex import split
+import subprocess
+import threading
+
+from . import TemporaryVenv
+from ._events import qualified_name, record
+from ._utils import (
+    BIN_DIR, DEFAULT_INSTALL_COMMAND, PYTHON_FILENAME, python_command,
+    venv_environ,
+)
+
+log = getLogger(__name__)
+
+
+def _decode(data):
+    """
+    Decode process output as `subprocess` does with `universal_newlines`.
+    """
+    if data is None:
+        return None
+    text = data.decode(locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+async def run_subprocess(
+    cmd, *, input=None,  # pylint: disable=redefined-builtin
+    stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=None,
+    text=True, env=None
+):
+    """
+    asyncio equivalent of `subprocess.run` with `check=True`.
+
+    If the call times out, or the task running it is cancelled, the process
+    is killed.
+    """
+    if input is not None:
+        stdin = subprocess.PIPE
+        if text:
+            input = input.encode(locale.getpreferredencoding(False))
+    log.debug("Running command %s", cmd)
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdin=stdin, stdout=stdout, stderr=stderr, env=env
+    )
+    try:
+        out, err = await asyncio.wait_for(
+            process.communicate(input), timeout
+        )
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if text:
+        out, err = _decode(out), _decode(err)
+    result = subprocess.CompletedProcess(cmd, process.returncode, out, err)
+    result.check_returncode()
+    return result
+
+
+async def run_python_with_args(
+    *, python_exe, args=None, module=None, code=None, script=None,
+    input=None,  # pylint: disable=redefined-builtin
+    stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=None,
+    env=None
+):
+    """
+    asyncio equivalent of `venv_tools._utils.run_python_with_args`.
+    """
+    cmd_list = python_command(
+        python_exe=python_exe, args=args, module=module, code=code,
+        script=script,
+    )
+    with record("python", cmd_list) as recorder:
+        result = await run_subprocess(
+            cmd_list, input=input, stdin=stdin, stdout=stdout, stderr=stderr,
+            timeout=timeout, env=env,
+        )
+        recorder.set_result(result.returncode, result.stdout, result.stderr)
+    return result
+
+
+class AsyncVenv(object):
+    """
+    A venv whose methods are coroutines, so that many calls can be run
+    concurrently on an event loop. All methods take a `timeout`, and if it
+    expires (or the awaiting task is cancelled) the subprocess is killed.
+
+    Unlike `Venv`, `AsyncVenv` does not activate the venv, as changing the
+    environment of the whole process is not safe with concurrent tasks.
+    Instead, subprocesses are given the environment from `environ`.
+
+    :param str env_dir: The absolute path to the venv.
+    """
+    def __init__(self, env_dir):
+        self._env_dir = env_dir
+        self._install_command = DEFAULT_INSTALL_COMMAND
+
+    @property
+    def python_exe(self):
+        """
+        Path to python interpreter
+        """
+        return pth.join(self.env_dir, BIN_DIR, PYTHON_FILENAME)
+
+    @property
+    def env_dir(self):
+        """
+        The path to the virtual environment
+        """
+        return self._env_dir
+
+    @property
+    def install_command(self):
+        """
+        The command to install a python package in the virtualenv. Must be a
+        format string with python and package.
+        """
+        return self._install_command
+
+    @install_command.setter
+    def install_command(self, new_cmd):
+        self._install_command = new_cmd
+
+    def environ(self, base=None):
+        """
+        Return a copy of the environment `base` (by default `os.environ`) with
+        this venv activated.
+        """
+        return venv_environ(self.env_dir, base)
+
+    async def call_python_file(self, filename, *args, **kwargs):
+        """
+        Call a python file with the python interpreter associated with this
+        virtualenv.
+        """
+        kwargs.setdefault("env", self.environ())
+        return await run_python_with_args(
+            python_exe=self.python_exe, script=filename, args=args, **kwargs
+        )
+
+    async def call_python_module(self, module_name, *args, **kwargs):
+        """
+        Call a python module with the python interpreter associated with this
+        virtualenv.
+        """
+        kwargs.setdefault("env", self.environ())
+        return await run_python_with_args(
+            python_exe=self.python_exe, module=module_name, args=args, **kwargs
+        )
+
+    async def call_python_code(self, code, *args, **kwargs):
+        """
+        Call some python code with the python interpreter associated with this
+        virtualenv.
+        """
+        kwargs.setdefault("env", self.environ())
+        return await run_python_with_args(
+            python_exe=self.python_exe, code=code, args=args, **kwargs
+        )
+
+    async def install_package(self, package, timeout=None):
+        """
+        Install a python package into this virtualenv.
+        """
+        cmd = split(
+            self.install_command.format(
+                python=self.python_exe, package=package
+            )
+        )
+        with record("install", cmd, self.env_dir) as recorder:
+            result = await run_subprocess(
+                cmd, stderr=subprocess.STDOUT, timeout=timeout, text=False,
+                env=self.environ(),
+            )
+            recorder.set_result(0, result.stdout)
+        return result.stdout
+
+
+class AsyncTemporaryVenv(TemporaryVenv):
+    """
+    Asynchronous context manager around creating a temporary venv.
+
+    This takes the same arguments as `TemporaryVenv`, with the addition of
+    `timeout` which limits how long creating the venv may take (raising
+    `subprocess.TimeoutExpired` if it expires). Venv builders
+    which provide a `command` method (such as the virtualenv builder) are run
+    as a subprocess without blocking the event loop; other builders, cloning
+    from a template cache and removing the venv are run in the loop's
+    default executor.
+
+    .. code-block :: python
+
+        async with AsyncTemporaryVenv() as env_dir:
+            await AsyncVenv(env_dir).call_python_code(code)
+    """
+    def __init__(
+        self, venv_builder=None, use_virtualenv=False, python_exe=None,
+        timeout=None, **kwargs
+    ):
+        super().__init__(
+            venv_builder=venv_builder, use_virtualenv=use_virtualenv,
+            python_exe=python_exe, **kwargs
+        )
+        self._timeout = timeout
+
+    async def _build_async(self, env_dir):
+        if self._template_cache is None:
+            venv = self._venv_builder(**self._builder_kwargs())
+            if hasattr(venv, "command"):
+                cmd = venv.command(env_dir)
+                with record("virtualenv", cmd, env_dir) as recorder:
+                    result = await run_subprocess(
+                        cmd, stderr=subprocess.STDOUT, timeout=self._timeout,
+                        text=False,
+                    )
+                    recorder.set_result(0, result.stdout)
+                return
+        loop = asyncio.get_event_loop()
+        abandoned = threading.Event()
+        try:
+            await asyncio.wait_for(loop.run_in_executor(
+                None, self._build_in_thread, env_dir, abandoned
+            ), self._timeout)
+        except asyncio.TimeoutError:
+            abandoned.set()
+            raise subprocess.TimeoutExpired(
+                qualified_name(self._venv_builder), self._timeout
+            )
+        except asyncio.CancelledError:
+            abandoned.set()
+            raise
+
+    def _build_in_thread(self, env_dir, abandoned):
+        """
+        Run `_build` in an executor thread. The thread cannot be stopped if
+        the coroutine waiting for it times out or is cancelled, so once
+        `abandoned` is set the thread removes `env_dir` when it finishes.
+        """
+        try:
+            self._build(env_dir)
+        finally:
+            if abandoned.is_set():
+                shutil.rmtree(env_dir, ignore_errors=True)
+
+    async def __aenter__(self):
+        env_dir = self._make_dir()
+        try:
+            with self._record_create(env_dir):
+                await self._build_async(env_dir)
+        except BaseException:
+            # an abandoned executor thread removes env_dir again once it has
+            # finished writing to it
+            shutil.rmtree(env_dir, ignore_errors=True)
+            raise
+        self.env_dir = env_dir
+        return env_dir
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._delete, self.env_dir)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._config
+~~~~~~~~~~
+
+Parsing of the `pyvenv.cfg` files described in PEP 405.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from collections import namedtuple
+import os
+import os.path as pth
+
+from ._utils import NOT_CACHED, StatCache
+
+PYVENV_CFG_CACHE_SIZE = 1024
+
+PyvenvConfig = namedtuple("PyvenvConfig", [
+    "home", "version", "include_system_site_packages", "executable",
+    "prompt", "extra",
+])
+PyvenvConfig.__doc__ = """
+The contents of a `pyvenv.cfg` file. `home` is `None` if the file does not
+contain the `home` key required by PEP 405 (so is not a valid venv), and
+other keys are `None` if not present. `include_system_site_packages` is a
+bool, and `extra` is a dict of all the other keys in the file.
+"""
+
+_cache = StatCache("pyvenv_cfg", PYVENV_CFG_CACHE_SIZE)
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+def parse_pyvenv_cfg(lines):
+    """
+    Parse the lines of a `pyvenv.cfg` file into a `PyvenvConfig`.
+    """
+    values = {}
+    for line in lines:
+        key, sep, value = line.partition("=")
+        if not sep:
+            continue
+        values[key.strip().lower()] = value.strip()
+    home = values.pop("home", None)
+    version = values.pop("version", None)
+    if version is None:
+        # virtualenv writes version_info, which includes the release level
+        version = values.get("version_info")
+    include_system_site_packages = values.pop(
+        "include-system-site-packages", "false"
+    ).lower() == "true"
+    executable = values.pop("executable", None)
+    prompt = values.pop("prompt", None)
+    if prompt is not None:
+        prompt = _unquote(prompt)
+    return PyvenvConfig(
+        home, version, include_system_site_packages, executable, prompt,
+        values,
+    )
+
+
+def read_pyvenv_cfg(cfg_path):
+    """
+    Read the `pyvenv.cfg` at `cfg_path`, returning a `PyvenvConfig`.
+
+    Results are cached (for up to `PYVENV_CFG_CACHE_SIZE` files) until the
+    modification time or size of the file changes. Raises `OSError` if the
+    file cannot be read.
+    """
+    stat = os.stat(cfg_path)
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cfg_path = pth.abspath(cfg_path)
+    config = _cache.get(cfg_path, key)
+    if config is NOT_CACHED:
+        with open(cfg_path) as f:
+            config = parse_pyvenv_cfg(f)
+        _cache.put(cfg_path, key, config)
+    return config
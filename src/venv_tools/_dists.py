@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._dists
+~~~~~~~~~~
+
+Finding the distributions installed in a venv by reading their metadata
+directly, without running the venv's python.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from collections import namedtuple
+from logging import getLogger
+import os
+import os.path as pth
+import sys
+
+from ._config import read_pyvenv_cfg
+from ._utils import NOT_CACHED, PYVENV_FILENAME, StatCache
+
+DIST_CACHE_SIZE = 256
+METADATA_FILENAMES = {
+    ".dist-info": "METADATA",
+    ".egg-info": "PKG-INFO",
+}
+
+Distribution = namedtuple("Distribution", ["name", "version", "path"])
+Distribution.__doc__ = """
+A distribution installed in a venv. `name` and `version` are as given in its
+metadata, and `path` is the path to its `.dist-info` (or `.egg-info`)
+directory.
+"""
+
+log = getLogger(__name__)
+
+_cache = StatCache("distributions", DIST_CACHE_SIZE)
+
+
+def _lib_dirs(env_dir):
+    """
+    The directories within `lib` of a posix venv which may contain
+    `site-packages`, such as `python3.8`.
+    """
+    lib_dir = pth.join(env_dir, "lib")
+    try:
+        return sorted(
+            entry.name for entry in os.scandir(lib_dir)
+            if entry.name.startswith(("python", "pypy"))
+            if entry.is_dir()
+        )
+    except OSError:
+        return []
+
+
+def site_packages_dirs(env_dir):
+    """
+    The `site-packages` directories of the venv at `env_dir`. On posix, the
+    python version in `pyvenv.cfg` is used to choose the directory if there
+    is more than one (and older PyPy venvs have `site-packages` at the top
+    level).
+    """
+    if sys.platform == "win32":
+        candidates = [pth.join(env_dir, "Lib", "site-packages")]
+    else:
+        lib_dirs = _lib_dirs(env_dir)
+        if len(lib_dirs) > 1:
+            try:
+                version = read_pyvenv_cfg(
+                    pth.join(env_dir, PYVENV_FILENAME)
+                ).version
+            except OSError:
+                version = None
+            if version is not None:
+                short_version = ".".join(version.split(".")[:2])
+                lib_dirs = [
+                    name for name in lib_dirs if name.endswith(short_version)
+                ] or lib_dirs
+        candidates = [
+            pth.join(env_dir, "lib", name, "site-packages")
+            for name in lib_dirs
+        ] or [pth.join(env_dir, "site-packages")]
+    return [path for path in candidates if pth.isdir(path)]
+
+
+def _read_metadata(path):
+    """
+    Read the name and version from the metadata file at `path`, only
+    reading the headers.
+    """
+    name = version = None
+    with open(path, encoding="utf8", errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                break
+            key, _, value = line.partition(":")
+            key = key.lower()
+            if key == "name":
+                name = value.strip()
+            elif key == "version":
+                version = value.strip()
+            if name is not None and version is not None:
+                break
+    return name, version
+
+
+def _scan_site_packages(site_dir):
+    dists = []
+    for entry in os.scandir(site_dir):
+        ext = pth.splitext(entry.name)[1]
+        if ext not in METADATA_FILENAMES:
+            continue
+        if entry.is_dir():
+            metadata_path = pth.join(entry.path, METADATA_FILENAMES[ext])
+        else:
+            # old style egg-info files are the metadata
+            metadata_path = entry.path
+        try:
+            name, version = _read_metadata(metadata_path)
+        except OSError as e:
+            log.debug("Skipping %s: %s", entry.path, e)
+            continue
+        if name is None:
+            log.debug("Skipping %s: no name in metadata", entry.path)
+            continue
+        dists.append(Distribution(name, version, entry.path))
+    return sorted(dists, key=lambda dist: dist.name.lower())
+
+
+def read_distributions(site_dir):
+    """
+    Return a `Distribution` for each distribution installed in the
+    directory `site_dir`.
+
+    Results are cached (for up to `DIST_CACHE_SIZE` directories) until the
+    modification time of `site_dir` changes, which happens whenever a
+    distribution is installed, upgraded or removed.
+    """
+    stat = os.stat(site_dir)
+    key = (stat.st_ino, stat.st_mtime_ns)
+    site_dir = pth.abspath(site_dir)
+    dists = _cache.get(site_dir, key)
+    if dists is NOT_CACHED:
+        dists = _scan_site_packages(site_dir)
+        _cache.put(site_dir, key, dists)
+    return list(dists)
+
+
+def clear_distributions_cache():
+    """
+    Clear the cache used by `read_distributions`.
+    """
+    _cache.clear()
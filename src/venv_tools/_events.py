@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._events
+~~~~~~~~~~
+
+Listeners which are told about the subprocesses run and venvs created and
+removed by venv_tools, so the time spent can be attributed.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from collections import namedtuple
+from logging import getLogger
+import threading
+import time
+
+log = getLogger(__name__)
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+class Event(namedtuple("Event", [
+    "kind", "command", "env_dir", "start", "end", "returncode",
+    "stdout_bytes", "stderr_bytes", "thread_id", "details",
+])):
+    """
+    Something venv_tools did, as passed to listeners. `kind` is one of:
+
+    ``"python"``
+        python was run by `run_python_with_args` (and so the `call_python_*`
+        methods), `stream_python_with_args` (the `stream_python_*` methods),
+        a `VenvWorker`, `VenvWorkerPool` or `VenvZygote`, or to find out
+        about an interpreter for `get_interpreter_info`. Streamed output is
+        not captured, so its size is not known.
+    ``"install"``
+        pip was run by `Venv.install_package` or `Venv.install_packages`.
+    ``"uninstall"``
+        pip was run by `Venv.uninstall_packages`.
+    ``"virtualenv"``
+        virtualenv was run by `VirtualenvBuilder.create`.
+    ``"create"``
+        A venv was created for a `TemporaryVenv` (including cloning from a
+        template), a `TemplateCache` template or a `VenvStore`.
+    ``"delete"``
+        A `TemporaryVenv` was removed.
+    ``"cache"``
+        One of venv_tools' caches was used. This has no duration.
+
+    `command` is the command run (or `None` if there was no subprocess),
+    `env_dir` the venv involved (if known), and `start` and `end` are
+    timestamps as from `time.time`. `returncode` is the exit code of the
+    subprocess (`None` if there was no subprocess or it timed out), and
+    `stdout_bytes` and `stderr_bytes` the size of any output captured.
+    `thread_id` is the `threading.get_ident` of the calling thread.
+
+    `details` is a dict of anything else known about the event. For
+    ``"create"`` events, it contains ``"builder"``, the name of the venv
+    builder class, and ``"source"``, one of ``"temporary"``, ``"template"``
+    or ``"store"``. For ``"cache"`` events, it contains ``"cache"``, the name
+    of the cache, and ``"hit"``, whether the cached value was used.
+    """
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        """
+        The time taken in seconds
+        """
+        return self.end - self.start
+
+
+def add_listener(callback):
+    """
+    Call `callback` with an `Event` after each subprocess run and each venv
+    created or removed. Callbacks are called in the thread which did the
+    work, so should be quick and thread safe; exceptions they raise are
+    logged and ignored.
+    """
+    with _listeners_lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    """
+    Stop calling `callback`, which must have been added by `add_listener`.
+    """
+    with _listeners_lock:
+        _listeners.remove(callback)
+
+
+def emit(event):
+    """
+    Call each listener with `event`.
+    """
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(event)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Listener %r failed", listener)
+
+
+def qualified_name(obj):
+    """
+    The name of the class or function `obj`, including its module.
+    """
+    return "{}.{}".format(obj.__module__, obj.__qualname__)
+
+
+def record_cache(cache, hit):
+    """
+    Emit an event for a lookup in `cache`, which either found a usable value
+    (`hit` is `True`) or not.
+    """
+    if not _listeners:
+        return
+    now = time.time()
+    emit(Event(
+        "cache", None, None, now, now, None, None, None,
+        threading.get_ident(), {"cache": cache, "hit": hit},
+    ))
+
+
+def _byte_count(output):
+    if output is None:
+        return None
+    if isinstance(output, str):
+        return len(output.encode("utf8", "surrogateescape"))
+    return len(output)
+
+
+class _Recorder(object):
+    """
+    Context manager which times its body, and emits an `Event` on exit.
+    """
+    def __init__(self, kind, command, env_dir, details):
+        self._kind = kind
+        self._command = command
+        self._env_dir = env_dir
+        self._details = details
+        self._start = None
+        self._start_counter = None
+        self.returncode = None
+        self.stdout = None
+        self.stderr = None
+
+    def set_result(self, returncode, stdout=None, stderr=None):
+        """
+        Record the result of the subprocess.
+        """
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def __enter__(self):
+        self._start = time.time()
+        self._start_counter = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not _listeners:
+            return
+        duration = time.perf_counter() - self._start_counter
+        import subprocess  # pylint: disable=import-outside-toplevel
+        if isinstance(exc_value, subprocess.CalledProcessError):
+            self.set_result(
+                exc_value.returncode, exc_value.output, exc_value.stderr
+            )
+        elif isinstance(exc_value, subprocess.TimeoutExpired):
+            self.set_result(None, exc_value.output, exc_value.stderr)
+        emit(Event(
+            self._kind, self._command, self._env_dir, self._start,
+            self._start + duration, self.returncode,
+            _byte_count(self.stdout), _byte_count(self.stderr),
+            threading.get_ident(), dict(self._details or {}),
+        ))
+
+
+def record(kind, command=None, env_dir=None, details=None):
+    """
+    Return a context manager which emits an `Event` of `kind` for the work
+    done within it. Use `set_result` on the context manager to record the
+    outcome of a subprocess; the outcome of a `CalledProcessError` or
+    `TimeoutExpired` raised within it is recorded automatically. `details`
+    is passed on as `Event.details`.
+    """
+    return _Recorder(kind, command, env_dir, details)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._find
+~~~~~~~~~~
+
+Discovery of venvs within a directory tree.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+import os
+
+from ._utils import _detect_venv
+
+SKIPPED_DIRS = frozenset(["site-packages"])
+
+log = getLogger(__name__)
+
+
+def _scan_dir(path):
+    """
+    List `path` once, returning whether it is a venv, and if not, the
+    subdirectories to search.
+    """
+    try:
+        entries = list(os.scandir(path))
+    except OSError as e:
+        log.debug("Skipping %s: %s", path, e)
+        return False, []
+    names = {entry.name.lower() for entry in entries}
+    if _detect_venv(path, names):
+        return True, []
+    return False, [
+        entry.path for entry in entries
+        if entry.name not in SKIPPED_DIRS
+        if entry.is_dir(follow_symlinks=False)
+    ]
+
+
+def find_venvs(root, max_depth=None, workers=None):
+    """
+    Find the venvs and virtualenvs within the directory `root` (including
+    `root` itself), yielding their paths as they are found.
+
+    The tree is searched using a pool of `workers` threads (the default is
+    chosen by `concurrent.futures.ThreadPoolExecutor`), so paths are not
+    yielded in any particular order. The search does not descend into venvs,
+    `site-packages` directories or symlinks to directories.
+
+    :param str root: The directory to search.
+    :param int max_depth: How many levels of directories below `root` to
+        search. Defaults to no limit.
+    :param int workers: The number of threads to use.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_dir, root): (root, 0)}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, depth = pending.pop(future)
+                    found, subdirs = future.result()
+                    if found:
+                        yield path
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    for subdir in subdirs:
+                        pending[executor.submit(_scan_dir, subdir)] = (
+                            subdir, depth + 1
+                        )
+        finally:
+            for future in pending:
+                future.cancel()
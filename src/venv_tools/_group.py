@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._group
+~~~~~~~~~~
+
+Running the same operation across many venvs in parallel.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+import time
+
+log = getLogger(__name__)
+
+GroupResult = namedtuple(
+    "GroupResult", ["venv", "result", "error", "duration"]
+)
+GroupResult.__doc__ = """
+The result of an operation on one venv in a `VenvGroup`. If the operation
+raised an exception, `error` is the exception and `result` is `None`.
+`duration` is the time taken in seconds.
+"""
+
+
+def _timed_call(func, venv):
+    start = time.perf_counter()
+    try:
+        result = func(venv)
+    except Exception as e:  # pylint: disable=broad-except
+        log.debug("%s failed in %s: %s", func, venv.env_dir, e)
+        return GroupResult(venv, None, e, time.perf_counter() - start)
+    return GroupResult(venv, result, None, time.perf_counter() - start)
+
+
+class VenvGroup(object):
+    """
+    A collection of venvs, which can run the same operation on every venv in
+    parallel.
+
+    The `map_*` methods run on a pool of at most `max_workers` threads
+    (the default is chosen by `concurrent.futures.ThreadPoolExecutor`), and
+    return a `GroupResult` for each venv, in the same order as the venvs.
+    Exceptions are recorded in the results rather than raised.
+
+    :param venvs: The venvs, either as `Venv` objects or paths.
+    """
+    def __init__(self, venvs):
+        from . import Venv  # pylint: disable=import-outside-toplevel
+        self._venvs = [
+            venv if isinstance(venv, Venv) else Venv(venv) for venv in venvs
+        ]
+
+    @property
+    def venvs(self):
+        """
+        The venvs in the group
+        """
+        return list(self._venvs)
+
+    def __len__(self):
+        return len(self._venvs)
+
+    def __iter__(self):
+        return iter(self._venvs)
+
+    def map(self, func, max_workers=None):
+        """
+        Call `func` with each venv.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda venv: _timed_call(func, venv), self._venvs
+            ))
+
+    def map_python_file(self, filename, *args, max_workers=None, **kwargs):
+        """
+        Call a python file with the python interpreter of each venv.
+        """
+        return self.map(
+            lambda venv: venv.call_python_file(filename, *args, **kwargs),
+            max_workers=max_workers,
+        )
+
+    def map_python_module(
+        self, module_name, *args, max_workers=None, **kwargs
+    ):
+        """
+        Call a python module with the python interpreter of each venv.
+        """
+        return self.map(
+            lambda venv: venv.call_python_module(module_name, *args, **kwargs),
+            max_workers=max_workers,
+        )
+
+    def map_python_code(self, code, *args, max_workers=None, **kwargs):
+        """
+        Call some python code with the python interpreter of each venv.
+        """
+        return self.map(
+            lambda venv: venv.call_python_code(code, *args, **kwargs),
+            max_workers=max_workers,
+        )
+
+    def map_install(self, packages, max_workers=None, **kwargs):
+        """
+        Install `packages` into each venv, using `Venv.install_packages`.
+        """
+        packages = list(packages)
+        return self.map(
+            lambda venv: venv.install_packages(packages, **kwargs),
+            max_workers=max_workers,
+        )
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._interpreter
+~~~~~~~~~~
+
+Information about python interpreters, cached in memory and on disk so each
+interpreter only needs to be run once.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from collections import namedtuple
+import hashlib
+import json
+from logging import getLogger
+import os
+import os.path as pth
+import subprocess
+import tempfile
+import threading
+
+from ._events import record, record_cache
+from ._utils import abspath_python_exe, get_cache_dir
+
+# Run by the interpreter being probed, so must work on any python version
+PROBE_CODE = """
+import json, platform, sys, sysconfig
+try:
+    from importlib.util import find_spec
+except ImportError:
+    from pkgutil import find_loader as find_spec
+implementation = getattr(sys, "implementation", None)
+paths = sysconfig.get_paths()
+print(json.dumps({
+    "executable": sys.executable,
+    "version": platform.python_version(),
+    "version_info": list(sys.version_info),
+    "implementation": platform.python_implementation().lower(),
+    "prefix": sys.prefix,
+    "base_prefix": getattr(
+        sys, "base_prefix", getattr(sys, "real_prefix", sys.prefix)
+    ),
+    "purelib": paths["purelib"],
+    "platlib": paths["platlib"],
+    "platform": sysconfig.get_platform(),
+    "soabi": sysconfig.get_config_var("SOABI"),
+    "cache_tag": getattr(implementation, "cache_tag", None),
+    "has_venv": find_spec("venv") is not None,
+    "has_ensurepip": find_spec("ensurepip") is not None,
+}))
+"""
+
+InterpreterInfo = namedtuple("InterpreterInfo", [
+    "executable", "version", "version_info", "implementation", "prefix",
+    "base_prefix", "purelib", "platlib", "platform", "soabi", "cache_tag",
+    "has_venv", "has_ensurepip",
+])
+InterpreterInfo.__doc__ = """
+Details of a python interpreter, as reported by the interpreter itself.
+`platform`, `soabi` and `cache_tag` are the platform, ABI and bytecode cache
+tags, and `has_venv` and `has_ensurepip` are whether those modules can be
+imported.
+"""
+
+log = getLogger(__name__)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_key(python_exe):
+    """
+    The key identifying `python_exe`. The interpreter is identified by the
+    path used to run it (as a venv's python may be a symlink to the base
+    interpreter, but reports different prefixes), and the identity of the
+    file it resolves to.
+    """
+    stat = os.stat(python_exe)
+    return (
+        python_exe, pth.realpath(python_exe), stat.st_ino, stat.st_size,
+        stat.st_mtime_ns,
+    )
+
+
+def _make_info(data):
+    data["version_info"] = tuple(data["version_info"])
+    return InterpreterInfo(**data)
+
+
+def _read_cache_file(cache_file):
+    try:
+        with open(cache_file) as f:
+            return _make_info(json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        log.debug("Ignoring cache file %s: %s", cache_file, e)
+        return None
+
+
+def _write_cache_file(cache_file, info):
+    cache_dir = pth.dirname(cache_file)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(info._asdict(), f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        log.debug("Cannot write cache file %s: %s", cache_file, e)
+
+
+def probe_interpreter(python_exe):
+    """
+    Run `python_exe` to find out about it, returning an `InterpreterInfo`.
+    This bypasses the cache, use `get_interpreter_info` instead.
+    """
+    cmd = [python_exe, "-c", PROBE_CODE]
+    with record("python", cmd) as recorder:
+        output = subprocess.check_output(cmd, universal_newlines=True)
+        recorder.set_result(0, output)
+    return _make_info(json.loads(output))
+
+
+def get_interpreter_info(python_exe=None, cache_dir=None):
+    """
+    Return an `InterpreterInfo` for `python_exe` (by default, the current
+    interpreter).
+
+    The result is cached in memory, and on disk in `cache_dir` (by default
+    `interpreters` in the user's cache directory), until the file the
+    interpreter resolves to changes. The interpreter is only run if there is
+    no cached result.
+
+    :param str python_exe: The path to the python executable (relative or
+        absolute), or the name of the executable on the system path.
+    :param str cache_dir: The directory for the disk cache.
+    """
+    python_exe = pth.abspath(abspath_python_exe(python_exe))
+    if cache_dir is None:
+        cache_dir = pth.join(get_cache_dir(), "interpreters")
+    key = _cache_key(python_exe)
+    with _cache_lock:
+        info = _cache.get(key)
+    if info is not None:
+        record_cache("interpreter", True)
+        return info
+
+    cache_file = pth.join(
+        cache_dir,
+        hashlib.sha256(repr(key).encode("utf8")).hexdigest() + ".json"
+    )
+    info = _read_cache_file(cache_file)
+    record_cache("interpreter", info is not None)
+    if info is None:
+        log.debug("Probing interpreter %s", python_exe)
+        info = probe_interpreter(python_exe)
+        _write_cache_file(cache_file, info)
+    with _cache_lock:
+        _cache[key] = info
+    return info
+
+
+def clear_interpreter_cache():
+    """
+    Clear the in memory cache used by `get_interpreter_info`. The disk cache
+    is left as is.
+    """
+    with _cache_lock:
+        _cache.clear()
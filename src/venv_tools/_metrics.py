@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._metrics
+~~~~~~~~~~
+
+Counters and histograms of the events from venv_tools, rendered in the
+Prometheus text exposition format.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from logging import getLogger
+import os
+import os.path as pth
+from socketserver import ThreadingMixIn
+import tempfile
+import threading
+
+from ._events import add_listener, remove_listener
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0, 120.0, 300.0,
+)
+
+# name: (type, help, label names)
+METRICS = {
+    "venv_tools_venv_creations_total": (
+        "counter", "Venvs created.", ("builder", "source"),
+    ),
+    "venv_tools_venv_creation_seconds": (
+        "histogram", "Time taken to create a venv.", ("builder", "source"),
+    ),
+    "venv_tools_venv_teardown_seconds": (
+        "histogram", "Time taken to remove a temporary venv.", (),
+    ),
+    "venv_tools_install_seconds": (
+        "histogram", "Time taken by pip to install packages.", (),
+    ),
+    "venv_tools_install_failures_total": (
+        "counter", "Installs where pip failed or timed out.", (),
+    ),
+    "venv_tools_python_call_seconds": (
+        "histogram", "Time taken by calls to python in a venv.", (),
+    ),
+    "venv_tools_python_call_failures_total": (
+        "counter", "Calls to python which failed or timed out.", (),
+    ),
+    "venv_tools_cache_requests_total": (
+        "counter", "Lookups in venv_tools caches.", ("cache", "result"),
+    ),
+}
+
+log = getLogger(__name__)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace(
+        '"', r'\"'
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, _escape(value)) for name, value in labels
+    ) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    """
+    A listener (see `add_listener`) which keeps counts and histograms of
+    venv creations (by builder), teardown times, pip install and python call
+    latencies and failures, and cache hits and misses.
+
+    Use it as a context manager (or call `start` and `stop`) to collect
+    metrics, and `render`, `write` or `serve` to export them:
+
+    .. code-block :: python
+
+        metrics = Metrics().start()
+        metrics.serve(("127.0.0.1", 9200))
+
+    :param buckets: The upper bounds in seconds of the histogram buckets.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def _inc(self, name, labels=()):
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[labels] = values.get(labels, 0) + 1
+
+    def _observe(self, name, value, labels=()):
+        with self._lock:
+            values = self._histograms.setdefault(name, {})
+            if labels not in values:
+                # a count per bucket, then the sum and count of all values
+                values[labels] = [0] * len(self._buckets) + [0.0, 0]
+            histogram = values[labels]
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def __call__(self, event):
+        if event.kind == "create":
+            labels = (
+                ("builder", event.details.get("builder", "")),
+                ("source", event.details.get("source", "")),
+            )
+            self._inc("venv_tools_venv_creations_total", labels)
+            self._observe(
+                "venv_tools_venv_creation_seconds", event.duration, labels
+            )
+        elif event.kind == "delete":
+            self._observe("venv_tools_venv_teardown_seconds", event.duration)
+        elif event.kind == "install":
+            self._observe("venv_tools_install_seconds", event.duration)
+            if event.returncode != 0:
+                self._inc("venv_tools_install_failures_total")
+        elif event.kind == "python":
+            self._observe("venv_tools_python_call_seconds", event.duration)
+            if event.returncode != 0:
+                self._inc("venv_tools_python_call_failures_total")
+        elif event.kind == "cache":
+            self._inc("venv_tools_cache_requests_total", (
+                ("cache", event.details["cache"]),
+                ("result", "hit" if event.details["hit"] else "miss"),
+            ))
+
+    def start(self):
+        """
+        Start collecting metrics, returning `self`.
+        """
+        add_listener(self)
+        return self
+
+    def stop(self):
+        """
+        Stop collecting metrics.
+        """
+        remove_listener(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text, _) in sorted(METRICS.items()):
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} {}".format(name, metric_type))
+                if metric_type == "counter":
+                    for labels, value in sorted(
+                        self._counters.get(name, {}).items()
+                    ):
+                        lines.append("{}{} {}".format(
+                            name, _format_labels(labels), value
+                        ))
+                    continue
+                for labels, histogram in sorted(
+                    self._histograms.get(name, {}).items()
+                ):
+                    for bound, count in zip(
+                        self._buckets + (float("inf"),),
+                        histogram[:len(self._buckets)] + [histogram[-1]]
+                    ):
+                        lines.append("{}_bucket{} {}".format(
+                            name,
+                            _format_labels(
+                                labels + (("le", _format_value(bound)),)
+                            ),
+                            count,
+                        ))
+                    lines.append("{}_sum{} {}".format(
+                        name, _format_labels(labels),
+                        _format_value(histogram[-2]),
+                    ))
+                    lines.append("{}_count{} {}".format(
+                        name, _format_labels(labels), histogram[-1]
+                    ))
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        """
+        Write the metrics to `filename`, replacing it atomically so it can be
+        read at any time (such as by the node exporter's textfile collector).
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=pth.dirname(pth.abspath(filename)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.render())
+            # mkstemp creates files only readable by the current user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def handler(self):
+        """
+        A `http.server.BaseHTTPRequestHandler` subclass which responds to
+        every GET request with the metrics.
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            # pylint: disable=missing-docstring,invalid-name
+            def do_GET(self):
+                body = metrics.render().encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # pylint: disable=redefined-builtin
+                log.debug(format, *args)
+
+        return MetricsHandler
+
+    def serve(self, address):
+        """
+        Serve the metrics over HTTP on `address` (a `(host, port)` tuple)
+        from a background thread, returning the server. Call `shutdown` on
+        the server to stop it.
+        """
+        server = _ThreadingHTTPServer(address, self.handler())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
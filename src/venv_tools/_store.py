@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._store
+~~~~~~~~~~
+
+Persistent store of venvs, addressed by their contents.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import hashlib
+from logging import getLogger
+import os
+import os.path as pth
+import shutil
+import tempfile
+
+from ._events import qualified_name, record, record_cache
+from ._templates import relocate_venv
+from ._utils import (
+    abspath_python_exe, get_cache_dir, get_default_venv_builder,
+    normalize_requirement,
+)
+
+log = getLogger(__name__)
+
+
+class VenvStore(object):
+    """
+    A store of venvs, each identified by the python executable used and the
+    requirements installed into it.
+
+    Venvs are built in a staging directory inside the store, and only moved
+    into place once all the requirements are installed, so a venv which is
+    found in the store is always complete. Venvs in the store are shared, so
+    should not be modified by their users.
+
+    :param str root: The directory to store venvs in. Defaults to `store` in
+        the user's cache directory.
+    :param bool use_virtualenv: Use virtualenv instead of the default to create
+        the venvs.
+    :param venv_builder: An object which creates a venv. It must define a
+        method `create` which takes one argument, `env_dir`, and creates a venv
+        at that path. Any additional keywords passed to `VenvStore` will be
+        passed to the object.
+
+    :type venv_builder: `venv.EnvBuilder or similar`
+    """
+    def __init__(
+        self, root=None, venv_builder=None, use_virtualenv=False, **kwargs
+    ):
+        if root is None:
+            root = pth.join(get_cache_dir(), "store")
+        self._root = root
+        self._venv_builder = venv_builder
+        self._use_virtualenv = use_virtualenv
+        self._kwargs = kwargs
+        self._kwargs.setdefault("with_pip", True)
+
+    @property
+    def root(self):
+        """
+        The directory venvs are stored in
+        """
+        return self._root
+
+    def _get_venv_builder(self, path_to_python_exe):
+        return self._venv_builder or get_default_venv_builder(
+            self._use_virtualenv, path_to_python_exe,
+        )
+
+    def key(self, requirements=(), python_exe=None):
+        """
+        The key identifying the venv for `python_exe` with `requirements`
+        installed.
+        """
+        path_to_python_exe = pth.realpath(abspath_python_exe(python_exe))
+        venv_builder = self._get_venv_builder(path_to_python_exe)
+        key_parts = (
+            path_to_python_exe,
+            venv_builder.__module__,
+            venv_builder.__qualname__,
+            sorted((k, repr(v)) for k, v in self._kwargs.items()),
+            sorted(set(
+                normalize_requirement(req) for req in requirements
+                if req.strip()
+            )),
+        )
+        return hashlib.sha256(repr(key_parts).encode("utf8")).hexdigest()
+
+    def path_for(self, requirements=(), python_exe=None):
+        """
+        The path where the venv for `python_exe` with `requirements` installed
+        is (or would be) stored.
+        """
+        return pth.join(self.root, self.key(requirements, python_exe))
+
+    def get(self, requirements=(), python_exe=None):
+        """
+        Return a `Venv` for `python_exe` with `requirements` installed,
+        building it if it is not already in the store.
+
+        :param requirements: The requirements to install, in any form accepted
+            by pip.
+        :param str python_exe: The path to the python executable (relative or
+            absolute), or the name of the executable on the system path.
+        """
+        from . import Venv  # pylint: disable=import-outside-toplevel
+
+        requirements = [req for req in requirements if req.strip()]
+        env_dir = self.path_for(requirements, python_exe)
+        if pth.isdir(env_dir):
+            log.debug("Using stored venv %s", env_dir)
+            record_cache("store", True)
+            return Venv(env_dir)
+        record_cache("store", False)
+
+        path_to_python_exe = abspath_python_exe(python_exe)
+        kwargs = dict(self._kwargs)
+        kwargs["clear"] = True
+        kwargs["path_to_python_exe"] = path_to_python_exe
+        os.makedirs(self.root, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=".build-", dir=self.root)
+        try:
+            venv_builder = self._get_venv_builder(path_to_python_exe)
+            with record("create", env_dir=build_dir, details={
+                "builder": qualified_name(venv_builder),
+                "source": "store",
+            }):
+                venv_builder(**kwargs).create(build_dir)
+            if requirements:
+                Venv(build_dir).install_packages(requirements)
+            relocate_venv(build_dir, build_dir, env_dir)
+            # mkdtemp creates directories only readable by the current user
+            os.chmod(build_dir, 0o755)
+        except BaseException:
+            shutil.rmtree(build_dir)
+            raise
+        try:
+            os.rename(build_dir, env_dir)
+        except OSError:
+            if not pth.isdir(env_dir):
+                raise
+            # another process published the venv first
+            shutil.rmtree(build_dir)
+        else:
+            log.debug("Stored new venv %s", env_dir)
+        return Venv(env_dir)
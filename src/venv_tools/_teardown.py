@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._teardown
+~~~~~~~~~~
+
+Removing venvs quickly, by moving them out of the way at once and deleting
+them in the background using several threads.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, wait,
+)
+from logging import getLogger
+import os
+import os.path as pth
+import shutil
+import threading
+
+TRASH_PREFIX = ".venv_tools-trash-"
+
+# whether entries can be removed relative to an open directory, rather than
+# by resolving the full path each time
+_USE_DIR_FD = (
+    os.scandir in os.supports_fd and os.unlink in os.supports_dir_fd
+)
+_OPEN_DIR_FLAGS = (
+    os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+)
+
+log = getLogger(__name__)
+
+
+def _clear_dir(path):
+    """
+    Remove everything in `path` which is not a directory, returning the
+    paths of the subdirectories.
+    """
+    subdirs = []
+    if not _USE_DIR_FD:
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            else:
+                os.unlink(entry.path)
+        return subdirs
+    fd = os.open(path, _OPEN_DIR_FLAGS)
+    try:
+        for entry in os.scandir(fd):
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(pth.join(path, entry.name))
+            else:
+                os.unlink(entry.name, dir_fd=fd)
+    finally:
+        os.close(fd)
+    return subdirs
+
+
+def _submit(executor, func, *args):
+    """
+    Submit `func` to `executor`, or call it at once if the executor has been
+    shut down (which happens to all executors when python starts to exit).
+    """
+    try:
+        return executor.submit(func, *args)
+    except RuntimeError:
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:  # pylint: disable=broad-except
+            future.set_exception(e)
+        return future
+
+
+def remove_tree(path, executor=None, workers=None):
+    """
+    Remove the directory `path` and everything in it, like `shutil.rmtree`,
+    but spreading the work across threads.
+
+    Each directory is listed once with `os.scandir`, and its files removed
+    relative to the open directory where the platform supports it. The
+    directories themselves are then removed deepest first.
+
+    :param executor: The `concurrent.futures.Executor` to run on. By default,
+        a new `ThreadPoolExecutor` with `workers` threads is used.
+    :param int workers: The number of threads to use if `executor` is not
+        given.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=workers) as new_executor:
+            return remove_tree(path, executor=new_executor)
+
+    dirs_by_depth = [[path]]
+    pending = {_submit(executor, _clear_dir, path): 0}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future) + 1
+                subdirs = future.result()
+                if not subdirs:
+                    continue
+                if len(dirs_by_depth) == depth:
+                    dirs_by_depth.append([])
+                dirs_by_depth[depth].extend(subdirs)
+                for subdir in subdirs:
+                    pending[_submit(executor, _clear_dir, subdir)] = depth
+    finally:
+        for future in pending:
+            future.cancel()
+    for dirs in reversed(dirs_by_depth):
+        for future in [_submit(executor, os.rmdir, d) for d in dirs]:
+            future.result()
+    return None
+
+
+class BackgroundTeardown(object):
+    """
+    Removes venvs in the background. `remove` renames the venv to a hidden
+    name in the same directory, which takes the same time however large the
+    venv is, and the renamed directory is then deleted by `remove_tree` on a
+    pool of `workers` threads.
+
+    Call `flush` to wait for all removals to finish, and `close` (or use as
+    a context manager) when done. Any removals still pending when python
+    exits are finished before it does, though once python has started to
+    exit the worker threads take no new work, so each directory is then
+    deleted by a single thread.
+
+    :param int workers: The number of threads used for deleting files (the
+        default is chosen by `concurrent.futures.ThreadPoolExecutor`).
+    """
+    def __init__(self, workers=None):
+        self._workers = ThreadPoolExecutor(max_workers=workers)
+        # runs one removal at a time, each using the worker threads
+        self._scheduler = ThreadPoolExecutor(max_workers=1)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _remove_trash(self, trash_dir):
+        try:
+            remove_tree(trash_dir, executor=self._workers)
+        except OSError as e:
+            log.warning("Failed to remove %s: %s", trash_dir, e)
+            shutil.rmtree(trash_dir, ignore_errors=True)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def remove(self, env_dir):
+        """
+        Move `env_dir` out of the way, and delete it in the background. Once
+        this returns, `env_dir` no longer exists.
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundTeardown has been closed.")
+        env_dir = pth.abspath(env_dir)
+        trash_dir = pth.join(
+            pth.dirname(env_dir), TRASH_PREFIX + pth.basename(env_dir)
+        )
+        os.rename(env_dir, trash_dir)
+        log.debug("Removing %s in the background", trash_dir)
+        future = self._scheduler.submit(self._remove_trash, trash_dir)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    @property
+    def pending(self):
+        """
+        The number of venvs waiting to be deleted
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """
+        Wait until all the venvs passed to `remove` have been deleted, or
+        for at most `timeout` seconds. Returns whether everything has been
+        deleted.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def close(self):
+        """
+        Wait for all pending removals, and stop the background threads.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._scheduler.shutdown(wait=True)
+        self._workers.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._templates
+~~~~~~~~~~
+
+Caching of pristine venvs which can be cloned instead of rebuilt.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import errno
+import hashlib
+from logging import getLogger
+import os
+import os.path as pth
+import shutil
+import sys
+import tempfile
+import threading
+
+from ._events import qualified_name, record, record_cache
+from ._utils import BIN_DIR, PYVENV_FILENAME, get_cache_dir
+
+TEMPLATE_ORIGIN_FILENAME = ".venv_tools-template-origin"
+
+# from linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+log = getLogger(__name__)
+
+
+def _reflink(src, dst):
+    """
+    Create `dst` as a copy-on-write clone of `src`. Raises `OSError` if the
+    platform or filesystem does not support this.
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflinks not supported", src)
+    import fcntl  # pylint: disable=import-outside-toplevel
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+class _Linker(object):
+    """
+    Copies files using the cheapest method available, remembering which
+    methods have failed so they are only tried once per clone.
+    """
+    def __init__(self, hardlink=True):
+        self._methods = [_reflink]
+        if hardlink:
+            self._methods.append(os.link)
+
+    def __call__(self, src, dst):
+        while self._methods:
+            try:
+                return self._methods[0](src, dst)
+            except OSError as e:
+                log.debug(
+                    "Cannot use %s to clone %s: %s",
+                    self._methods[0].__name__, src, e
+                )
+                self._methods.pop(0)
+        return shutil.copy2(src, dst)
+
+
+def _clone_tree(src, dst, linker):
+    """
+    Recursively clone the contents of `src` into the existing directory `dst`.
+    """
+    for entry in os.scandir(src):
+        if entry.name == TEMPLATE_ORIGIN_FILENAME:
+            continue
+        dst_path = pth.join(dst, entry.name)
+        if entry.is_symlink():
+            os.symlink(os.readlink(entry.path), dst_path)
+        elif entry.is_dir():
+            os.mkdir(dst_path)
+            _clone_tree(entry.path, dst_path, linker)
+            shutil.copystat(entry.path, dst_path)
+        else:
+            linker(entry.path, dst_path)
+
+
+def _rewrite_file(path, old, new):
+    """
+    Replace `old` with `new` in file `path`. The file is replaced rather than
+    modified in place, so hardlinked copies are left untouched.
+    """
+    with open(path, "rb") as f:
+        contents = f.read()
+    if old not in contents:
+        return
+    tmp_path = path + ".venv_tools-tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(contents.replace(old, new))
+    shutil.copymode(path, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def relocate_venv(env_dir, old_env_dir, new_env_dir=None):
+    """
+    Fix up a venv at `env_dir` which was originally created at `old_env_dir`,
+    so that it can be used at `new_env_dir` (by default, `env_dir`).
+
+    Only the files which venv tools write absolute paths into are updated,
+    namely `pyvenv.cfg` and the scripts and symlinks in the bin directory.
+    """
+    if new_env_dir is None:
+        new_env_dir = env_dir
+    old = os.fsencode(old_env_dir)
+    new = os.fsencode(new_env_dir)
+    cfg_path = pth.join(env_dir, PYVENV_FILENAME)
+    if pth.isfile(cfg_path):
+        _rewrite_file(cfg_path, old, new)
+    bin_dir = pth.join(env_dir, BIN_DIR)
+    if not pth.isdir(bin_dir):
+        return
+    for entry in os.scandir(bin_dir):
+        if entry.is_symlink():
+            target = os.readlink(entry.path)
+            if target.startswith(old_env_dir):
+                os.unlink(entry.path)
+                os.symlink(
+                    new_env_dir + target[len(old_env_dir):], entry.path
+                )
+        elif entry.is_file():
+            _rewrite_file(entry.path, old, new)
+
+
+def clone_venv(template_dir, env_dir, hardlink=True):
+    """
+    Clone the template venv at `template_dir` into the existing empty
+    directory `env_dir`.
+
+    Files are reflinked where the filesystem supports it, otherwise they are
+    hardlinked (if `hardlink` is true) or copied. Files which need to be
+    rewritten to refer to `env_dir` are always replaced with new copies.
+    """
+    with open(pth.join(template_dir, TEMPLATE_ORIGIN_FILENAME)) as f:
+        origin = f.read()
+    _clone_tree(template_dir, env_dir, _Linker(hardlink=hardlink))
+    relocate_venv(env_dir, origin)
+
+
+class TemplateCache(object):
+    """
+    Cache of pristine venvs which are cloned instead of being rebuilt.
+
+    Templates are keyed by the python executable (path and modification
+    time), the venv builder class, and the keywords passed to the builder.
+    The first request for a key builds a template, which is published
+    atomically so that the cache can be shared between processes.
+
+    .. note::
+        When hardlinks are used, files in a clone share storage with the
+        template. Tools such as pip replace rather than modify files, but
+        anything editing files in place will also modify the template.
+
+    :param str cache_dir: The directory to store templates in. Defaults to
+        `templates` in the user's cache directory.
+    :param bool hardlink: Whether to fall back to hardlinking files when
+        reflinks are not available. If false, files are copied.
+    """
+    def __init__(self, cache_dir=None, hardlink=True):
+        if cache_dir is None:
+            cache_dir = pth.join(get_cache_dir(), "templates")
+        self._cache_dir = cache_dir
+        self._hardlink = hardlink
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self):
+        """
+        The directory templates are stored in
+        """
+        return self._cache_dir
+
+    def key(self, venv_builder, python_exe, kwargs):
+        """
+        The key for the template built by `venv_builder` with `kwargs` for
+        the python executable `python_exe`.
+        """
+        python_exe = pth.realpath(python_exe)
+        key_parts = (
+            python_exe,
+            os.stat(python_exe).st_mtime_ns,
+            venv_builder.__module__,
+            venv_builder.__qualname__,
+            sorted((k, repr(v)) for k, v in kwargs.items()),
+        )
+        return hashlib.sha256(repr(key_parts).encode("utf8")).hexdigest()
+
+    def get_template(self, venv_builder, python_exe, kwargs):
+        """
+        Return the path to the template for the given arguments, building it
+        if needed.
+        """
+        template_dir = pth.join(
+            self.cache_dir, self.key(venv_builder, python_exe, kwargs)
+        )
+        with self._lock:
+            if pth.isdir(template_dir):
+                log.debug("Using cached template %s", template_dir)
+                record_cache("templates", True)
+                return template_dir
+            record_cache("templates", False)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            build_dir = tempfile.mkdtemp(prefix=".build-", dir=self.cache_dir)
+            try:
+                with record("create", env_dir=build_dir, details={
+                    "builder": qualified_name(venv_builder),
+                    "source": "template",
+                }):
+                    venv = venv_builder(**kwargs)
+                    venv.create(build_dir)
+                with open(
+                    pth.join(build_dir, TEMPLATE_ORIGIN_FILENAME), "w"
+                ) as f:
+                    f.write(build_dir)
+            except BaseException:
+                shutil.rmtree(build_dir)
+                raise
+            try:
+                os.rename(build_dir, template_dir)
+            except OSError:
+                if not pth.isdir(template_dir):
+                    raise
+                # another process published the template first
+                shutil.rmtree(build_dir)
+            else:
+                log.debug("Created template %s", template_dir)
+        return template_dir
+
+    def clone(self, venv_builder, python_exe, kwargs, env_dir):
+        """
+        Create a venv at `env_dir` (which must be an existing empty directory)
+        from the template for the given arguments.
+        """
+        template_dir = self.get_template(venv_builder, python_exe, kwargs)
+        clone_venv(template_dir, env_dir, hardlink=self._hardlink)
+
+    def clear(self):
+        """
+        Remove all templates from the cache.
+        """
+        with self._lock:
+            if pth.isdir(self.cache_dir):
+                shutil.rmtree(self.cache_dir)
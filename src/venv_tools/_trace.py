@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._trace
+~~~~~~~~~~
+
+Recording events as a Trace Event Format file, which can be loaded into
+trace viewers such as Perfetto or chrome://tracing.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import json
+import os
+import threading
+
+from ._events import add_listener, remove_listener
+
+
+def _trace_event(event, pid):
+    """
+    Convert an `Event` into a complete ("X") trace event, or an instant
+    ("i") event for cache lookups.
+    """
+    if event.kind == "cache":
+        return {
+            "name": "cache:" + event.details["cache"],
+            "cat": "venv_tools",
+            "ph": "i",
+            "s": "t",
+            "ts": event.start * 1e6,
+            "pid": pid,
+            "tid": event.thread_id,
+            "args": event.details,
+        }
+    args = {
+        "env_dir": event.env_dir,
+        "returncode": event.returncode,
+        "stdout_bytes": event.stdout_bytes,
+        "stderr_bytes": event.stderr_bytes,
+    }
+    args.update(event.details)
+    if event.command is not None:
+        args["command"] = " ".join(str(arg) for arg in event.command)
+    return {
+        "name": event.kind,
+        "cat": "venv_tools",
+        "ph": "X",
+        "ts": event.start * 1e6,
+        "dur": event.duration * 1e6,
+        "pid": pid,
+        "tid": event.thread_id,
+        "args": args,
+    }
+
+
+class TraceRecorder(object):
+    """
+    Records the events from venv_tools while it is used as a context manager,
+    and writes them to `filename` in the Trace Event Format on exit.
+
+    Each event becomes a span on the lane of the thread it happened in, so
+    spans nest (such as virtualenv being run while creating a
+    `TemporaryVenv`), and work done in parallel appears side by side:
+
+    .. code-block :: python
+
+        with TraceRecorder("trace.json"):
+            with TemporaryVenv(with_pip=True) as env_dir:
+                Venv(env_dir).install_package("requests")
+
+    :param str filename: Where to write the trace, or `None` to only keep
+        the events in memory (use `write` to save them).
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    @property
+    def events(self):
+        """
+        The `Event` objects recorded so far
+        """
+        with self._lock:
+            return list(self._events)
+
+    def trace_events(self):
+        """
+        The events recorded so far, as trace events.
+        """
+        pid = os.getpid()
+        return [_trace_event(event, pid) for event in self.events]
+
+    def write(self, filename):
+        """
+        Write the events recorded so far to `filename`.
+        """
+        with open(filename, "w") as f:
+            json.dump({
+                "traceEvents": self.trace_events(),
+                "displayTimeUnit": "ms",
+            }, f)
+
+    def __enter__(self):
+        add_listener(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_listener(self)
+        if self.filename is not None:
+            self.write(self.filename)
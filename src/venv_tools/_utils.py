@@ -8,17 +8,23 @@ Useful internal functions
 :copyright: (c) 2014 by James Tocknell.
 :license: BSD, see LICENSE for more details.
 """
+from collections import OrderedDict, namedtuple
 from logging import getLogger
 import os
 import os.path as pth
-import subprocess
+import re
 import sys
+import threading
 
+from ._events import record, record_cache
 from ._venv_builders import VirtualenvBuilder
 
 BIN_DIR = "Scripts" if sys.platform == 'win32' else "bin"
 PYTHON_FILENAME = "python.exe" if sys.platform == 'win32' else "python"
 PYVENV_FILENAME = "pyvenv.cfg"
+DEFAULT_INSTALL_COMMAND = "{python} -m pip install '{package}'"
+DEFAULT_BATCH_INSTALL_COMMAND = "{python} -m pip install"
+DEFAULT_UNINSTALL_COMMAND = "{python} -m pip uninstall --yes"
 ACTIVATE_FILENAMES = (
     "activate",
     "activate.csh",
@@ -28,44 +34,168 @@ ACTIVATE_FILENAMES = (
     "activate.ps1",
 )
 
+REQUIREMENT_NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+# as in pip, a comment starts at a "#" at the start of the line or after
+# whitespace, so URL fragments such as "#egg=name" are kept
+REQUIREMENT_COMMENT_RE = re.compile(r"(^|\s+)#.*$")
+ALREADY_SATISFIED_RE = re.compile(
+    r"^Requirement already satisfied: ([A-Za-z0-9][A-Za-z0-9._-]*)"
+    r".*\(([^()\s]+)\)\s*$"
+)
+PINNED_REQUIREMENT_RE = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?===?([^\s;,=<>!~*]+)$"
+)
+ARCHIVE_EXTENSIONS = (".whl", ".tar.gz", ".tar.bz2", ".zip")
+# distributions which are part of the venv itself, so never removed by sync
+PROTECTED_DISTRIBUTIONS = frozenset([
+    "pip", "setuptools", "wheel", "distribute", "pkg-resources",
+])
+STREAM_QUEUE_SIZE = 1024
+# the value of subprocess.PIPE, so that subprocess is only imported when a
+# process is run
+PIPE = -1
+VENV_CACHE_SIZE = 1024
+PATH_CACHE_SIZE = 256
+TMPFS_DIR = "/dev/shm"
+NOT_CACHED = object()
+
+InstallResult = namedtuple(
+    "InstallResult", ["requirement", "name", "version", "status"]
+)
+InstallResult.__doc__ = """
+The result of installing a single requirement with pip. `status` is one of
+"installed", "already-satisfied" or "unknown" (if the output of pip did not
+mention the requirement).
+"""
+
+SyncResult = namedtuple("SyncResult", ["installed", "removed", "unchanged"])
+SyncResult.__doc__ = """
+The result of `Venv.sync`. `installed` is an `InstallResult` for each
+requirement which was passed to pip, `removed` the names of the distributions
+uninstalled, and `unchanged` the names of the requirements which were already
+satisfied.
+"""
+
 log = getLogger(__name__)
 
 
-def pathremove(dirname, path):
+class StatCache(object):
+    """
+    A thread safe cache of up to `size` values, discarding the least recently
+    used. Each value is stored with a key (such as the modification time of
+    the file it was read from) which must still be valid for the value to be
+    used. Each lookup is passed to listeners as a ``"cache"`` event for the
+    cache `name`.
+    """
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+
+    def get(self, path, key):
+        """
+        Return the value cached for `path`, or `NOT_CACHED` if there is none
+        or it was stored with a key other than `key`.
+        """
+        return self.get_valid(path, lambda cached_key: cached_key == key)
+
+    def get_valid(self, path, is_valid):
+        """
+        Return the value cached for `path`, or `NOT_CACHED` if there is none
+        or `is_valid` returns false for the key it was stored with.
+        """
+        with self._lock:
+            cached = self._values.get(path)
+        hit = cached is not None and is_valid(cached[0])
+        if hit:
+            with self._lock:
+                if path in self._values:
+                    self._values.move_to_end(path)
+        record_cache(self.name, hit)
+        return cached[1] if hit else NOT_CACHED
+
+    def put(self, path, key, value):
+        """
+        Cache `value` for `path`, valid while `key` is unchanged.
+        """
+        with self._lock:
+            self._values[path] = (key, value)
+            self._values.move_to_end(path)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove everything from the cache.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+_venv_cache = StatCache("is_venv", VENV_CACHE_SIZE)
+_path_cache = StatCache("path", PATH_CACHE_SIZE)
+
+
+def pathremove(dirname, path, environ=None):
     """
     Remove `dirname` from path `path`.
     e.g. to remove `/bin` from `$PATH`
     >>> pathremove('/bin', 'PATH')
 
+    `environ` is the mapping to modify, by default `os.environ`.
+
     Based on shell function by Peter Ward
     """
-    os.environ[path] = os.pathsep.join(
-        p for p in os.environ[path].split(os.pathsep) if p != dirname
+    if environ is None:
+        environ = os.environ
+    environ[path] = os.pathsep.join(
+        p for p in environ.get(path, "").split(os.pathsep) if p != dirname
     )
 
 
-def pathprepend(dirname, path):
+def pathprepend(dirname, path, environ=None):
     """
     Prepend `dirname` ro path `path`.
     e.g. to prepend `/bin` to `$PATH`
     >>> pathprepend('/bin', 'PATH')
 
+    `environ` is the mapping to modify, by default `os.environ`.
+
     Based on shell function by Peter Ward
     """
-    pathremove(dirname, path)
-    os.environ[path] = dirname + os.pathsep + os.environ[path]
+    if environ is None:
+        environ = os.environ
+    pathremove(dirname, path, environ)
+    environ[path] = os.pathsep.join(p for p in (dirname, environ[path]) if p)
 
 
-def pathappend(dirname, path):
+def pathappend(dirname, path, environ=None):
     """
     Append `dirname` to path `path`.
     e.g. to append `/bin` to `$PATH`
     >>> pathappend('/bin', 'PATH')
 
+    `environ` is the mapping to modify, by default `os.environ`.
+
     Based on shell function by Peter Ward
     """
-    pathremove(dirname, path)
-    os.environ[path] = os.environ[path] + os.pathsep + dirname
+    if environ is None:
+        environ = os.environ
+    pathremove(dirname, path, environ)
+    environ[path] = os.pathsep.join(p for p in (environ[path], dirname) if p)
+
+
+def venv_environ(env_dir, base=None):
+    """
+    Return a copy of the environment `base` (by default `os.environ`) with the
+    venv at `env_dir` activated, as `bin/activate` would.
+    """
+    environ = dict(os.environ if base is None else base)
+    pathprepend(pth.join(env_dir, BIN_DIR), "PATH", environ)
+    environ.pop("PYTHONHOME", None)
+    environ["VIRTUAL_ENV"] = env_dir
+    return environ
 
 
 def get_default_venv_builder(use_virtualenv, path_to_python_exe):
@@ -86,20 +216,57 @@ def get_default_venv_builder(use_virtualenv, path_to_python_exe):
         return VirtualenvBuilder
 
 
+def _list_names(path):
+    """
+    The lowercased names of the entries in directory `path`, using a single
+    `os.scandir`. Returns an empty set if `path` cannot be read.
+    """
+    try:
+        return {entry.name.lower() for entry in os.scandir(path)}
+    except OSError:
+        return set()
+
+
+def _has_home_key(cfg_path):
+    """
+    Checks whether the `pyvenv.cfg` at `cfg_path` has the `home` key.
+    """
+    # _config uses StatCache from this module
+    from ._config import read_pyvenv_cfg  # pylint: disable=cyclic-import
+    try:
+        # home key required by PEP
+        return read_pyvenv_cfg(cfg_path).home is not None
+    except OSError:
+        return False
+
+
+def _detect_venv(path, names):
+    """
+    Checks whether `path`, which contains the entries `names` (as returned by
+    `_list_names`), is a virtualenv/venv.
+    """
+    if PYVENV_FILENAME in names and _has_home_key(
+        pth.join(path, PYVENV_FILENAME)
+    ):
+        return True
+    if BIN_DIR.lower() in names:
+        bin_names = _list_names(pth.join(path, BIN_DIR))
+        # we might have a virtualenv (/usr would pass the python test)
+        if bin_names & {"python", PYTHON_FILENAME}:
+            return any(f.lower() in bin_names for f in ACTIVATE_FILENAMES)
+    return False
+
+
 def is_virtualenv(path):
     """
     Checks whether `path` is a virtualenv.
 
     This function is somewhat redundant now that virtualenv uses venv
     """
-    if pth.exists(pth.join(path, BIN_DIR, "python")):
+    bin_names = _list_names(pth.join(path, BIN_DIR))
+    if bin_names & {"python", PYTHON_FILENAME}:
         # we might have a virtualenv (/usr would pass the above test)
-        activate_exists = any(
-            pth.exists(pth.join(path, BIN_DIR, f))
-            for f in ACTIVATE_FILENAMES
-        )
-        if activate_exists:
-            return True
+        return any(f.lower() in bin_names for f in ACTIVATE_FILENAMES)
     return False
 
 
@@ -107,21 +274,203 @@ def is_pep_405_venv(path):
     """
     Checks whether `path` is a PEP 405 venv.
     """
-    if pth.exists(pth.join(path, PYVENV_FILENAME)):
-        # we have a PEP 405 venv (probably)
-        with open(pth.join(path, PYVENV_FILENAME)) as f:
-            for line in f:
-                key = line.split("=")[0].strip()
-                if key == "home":  # home key required by PEP
-                    return True
-    return False
+    return _has_home_key(pth.join(path, PYVENV_FILENAME))
+
+
+def _venv_cache_key(path):
+    """
+    The inode and modification time of `path` and its bin directory, which
+    change when files which mark a venv are added or removed.
+    """
+    stat = os.stat(path)
+    try:
+        bin_mtime = os.stat(pth.join(path, BIN_DIR)).st_mtime_ns
+    except OSError:
+        bin_mtime = None
+    return (stat.st_ino, stat.st_mtime_ns, bin_mtime)
 
 
 def is_venv(path):
     """
     Checks whether `path` is a virtualenv/venv.
+
+    Results are cached (for up to `VENV_CACHE_SIZE` paths) until the
+    modification time of `path` or its bin directory changes. Use
+    `clear_venv_cache` to clear the cache.
+    """
+    try:
+        key = _venv_cache_key(path)
+    except OSError:
+        return False
+    path = pth.abspath(path)
+    verdict = _venv_cache.get(path, key)
+    if verdict is NOT_CACHED:
+        verdict = _detect_venv(path, _list_names(path))
+        _venv_cache.put(path, key, verdict)
+    return verdict
+
+
+def clear_venv_cache():
+    """
+    Clear the cache used by `is_venv`.
+    """
+    _venv_cache.clear()
+
+
+def canonicalize_name(name):
+    """
+    Normalise a python distribution name, as described in PEP 503.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def normalize_requirement(requirement):
+    """
+    Normalise a requirement string, so equivalent requirements compare equal.
+    The project name is canonicalised and whitespace removed.
+    """
+    requirement = "".join(requirement.split())
+    match = REQUIREMENT_NAME_RE.match(requirement)
+    if match is None:
+        return requirement
+    return canonicalize_name(match.group(1)) + requirement[match.end():]
+
+
+def requirement_name(requirement):
+    """
+    Guess the project name from a requirement, which may be a requirement
+    specifier or a path or URL to a distribution. Returns `None` if no name
+    could be found.
+    """
+    requirement = requirement.strip()
+    if requirement.endswith(ARCHIVE_EXTENSIONS):
+        requirement = requirement.replace("\\", "/").rsplit("/", 1)[-1]
+        return canonicalize_name(requirement.split("-", 1)[0])
+    match = REQUIREMENT_NAME_RE.match(requirement)
+    if match is None:
+        return None
+    return canonicalize_name(match.group(1))
+
+
+def strip_requirement_comment(line):
+    """
+    Remove any comment from a line of a requirements file, along with
+    surrounding whitespace.
+    """
+    return REQUIREMENT_COMMENT_RE.sub("", line).strip()
+
+
+def requirement_pin(requirement):
+    """
+    Return the project name and pinned version of a requirement, which may be
+    a `name==version` specifier or the path or URL to a wheel, and may end in
+    a comment. The version is `None` if the requirement is not pinned to a
+    single version, and the name is `None` if it cannot be found (such as
+    for a VCS URL without a `name @` prefix, a pip option or a comment).
+    """
+    requirement = strip_requirement_comment(requirement)
+    requirement = requirement.split(";", 1)[0].strip()
+    if requirement.endswith(".whl"):
+        filename = requirement.replace("\\", "/").rsplit("/", 1)[-1]
+        parts = filename.split("-")
+        if len(parts) >= 5:
+            return canonicalize_name(parts[0]), parts[1]
+    match = PINNED_REQUIREMENT_RE.match("".join(requirement.split()))
+    if match is not None:
+        return canonicalize_name(match.group(1)), match.group(2)
+    if requirement.endswith(ARCHIVE_EXTENSIONS):
+        return requirement_name(requirement), None
+    match = REQUIREMENT_NAME_RE.match(requirement)
+    if match is None:
+        return None, None
+    rest = requirement[match.end():].lstrip()
+    if rest and rest[0] not in "[=<>!~@(":
+        return None, None
+    return canonicalize_name(match.group(1)), None
+
+
+def parse_pip_install_output(output, requirements):
     """
-    return is_pep_405_venv(path) or is_virtualenv(path)
+    Work out what happened to each of `requirements` from the output of
+    `pip install`, returning an `InstallResult` for each.
+    """
+    installed = {}
+    satisfied = {}
+    for line in output.splitlines():
+        if line.startswith("Successfully installed "):
+            for dist in line.split()[2:]:
+                name, _, version = dist.rpartition("-")
+                installed[canonicalize_name(name)] = version
+            continue
+        match = ALREADY_SATISFIED_RE.match(line)
+        if match is not None:
+            satisfied[canonicalize_name(match.group(1))] = match.group(2)
+
+    results = []
+    for requirement in requirements:
+        name = requirement_name(requirement)
+        if name in installed:
+            status, version = "installed", installed[name]
+        elif name in satisfied:
+            status, version = "already-satisfied", satisfied[name]
+        else:
+            status, version = "unknown", None
+        results.append(InstallResult(requirement, name, version, status))
+    return results
+
+
+def get_cache_dir():
+    """
+    The directory which venv_tools uses to store persistent caches.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or pth.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or pth.join(
+            pth.expanduser("~"), ".cache"
+        )
+    return pth.join(base, "venv_tools")
+
+
+def _is_noexec(path):
+    """
+    Whether `path` is on a filesystem mounted without permission to run
+    executables, where a venv's scripts could not be run.
+    """
+    if not hasattr(os, "statvfs"):
+        return False
+    return bool(os.statvfs(path).f_flag & getattr(os, "ST_NOEXEC", 0))
+
+
+def select_temp_dir(candidates, min_free_space=None):
+    """
+    Return the first of the directories `candidates` which exists, can be
+    written to, allows executables to be run, and has at least
+    `min_free_space` bytes free. Returns `None` if none are suitable.
+    """
+    import shutil  # pylint: disable=import-outside-toplevel
+    for candidate in candidates:
+        try:
+            if not pth.isdir(candidate):
+                continue
+            if not os.access(candidate, os.W_OK | os.X_OK):
+                continue
+            if _is_noexec(candidate):
+                log.debug("Skipping %s as it is mounted noexec", candidate)
+                continue
+            if min_free_space is not None:
+                free = shutil.disk_usage(candidate).free
+                if free < min_free_space:
+                    log.debug(
+                        "Skipping %s as only %d bytes are free", candidate,
+                        free
+                    )
+                    continue
+        except OSError as e:
+            log.debug("Skipping %s: %s", candidate, e)
+            continue
+        return candidate
+    return None
 
 
 def abspath_python_exe(python_exe):
@@ -136,7 +485,7 @@ def abspath_python_exe(python_exe):
     try:
         return abspath_path_executable(python_exe)
     except FileNotFoundError:
-        return RuntimeError("Cannot find " + python_exe)
+        raise RuntimeError("Cannot find " + python_exe)
 
 
 def is_executable(path):
@@ -146,24 +495,96 @@ def is_executable(path):
     return pth.isfile(path) and os.access(path, os.X_OK)
 
 
+def _dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cached_path_lookup(search_path, executable):
+    """
+    Return the cached path (or `None` if not found) of `executable` on
+    `search_path`, or `NOT_CACHED` if there is no valid cached result. The
+    cached result is valid if none of the directories searched have been
+    modified since.
+    """
+    dirs = search_path.split(os.pathsep)
+    return _path_cache.get_valid((search_path, executable), lambda mtimes: all(
+        _dir_mtime(d) == mtime for d, mtime in zip(dirs, mtimes)
+    ))
+
+
+def abspath_path_executables(executables):
+    """
+    Discover the absolute paths of all of `executables` on the system path,
+    searching the path once. Returns a dict mapping each executable to its
+    path, or `None` if it could not be found.
+
+    Results are cached for each value of `PATH` until one of the directories
+    searched is modified. Changing the permissions of an executable does not
+    modify its directory, use `clear_path_cache` if needed.
+    """
+    search_path = os.environ["PATH"]
+    results = {}
+    to_find = []
+    for executable in executables:
+        cached = _cached_path_lookup(search_path, executable)
+        if cached is NOT_CACHED:
+            to_find.append(executable)
+        else:
+            results[executable] = cached
+
+    mtimes = []
+    found_at = {}
+    for path in search_path.split(os.pathsep):
+        if not to_find:
+            break
+        # find the modification time first, so any later change is noticed
+        mtimes.append(_dir_mtime(path))
+        for executable in list(to_find):
+            full_path = pth.join(path, executable)
+            if is_executable(full_path):
+                results[executable] = full_path
+                found_at[executable] = len(mtimes)
+                to_find.remove(executable)
+
+    for executable in to_find:
+        results[executable] = None
+        found_at[executable] = len(mtimes)
+    for executable, num_dirs in found_at.items():
+        _path_cache.put(
+            (search_path, executable), tuple(mtimes[:num_dirs]),
+            results[executable]
+        )
+    return results
+
+
 def abspath_path_executable(executable):
     """
     Discover absolute path of executable `executable` on system path.
+
+    Results are cached, see `abspath_path_executables`.
     """
-    for path in os.environ["PATH"].split(os.pathsep):
-        full_path = pth.join(path, executable)
-        if is_executable(full_path):
-            return full_path
-    raise FileNotFoundError(executable + " is not on current path")
+    full_path = abspath_path_executables([executable])[executable]
+    if full_path is None:
+        raise FileNotFoundError(executable + " is not on current path")
+    return full_path
 
 
-def run_python_with_args(
-    *, python_exe, args=None, module=None, code=None, script=None,
-    input=None,  # pylint: disable=redefined-builtin
-    stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=None
+def clear_path_cache():
+    """
+    Clear the cache used by `abspath_path_executable`.
+    """
+    _path_cache.clear()
+
+
+def python_command(
+    *, python_exe, args=None, module=None, code=None, script=None
 ):
     """
-    Wrapper around subprocess.run for calling python interpreter.
+    Build the command line for calling the python interpreter `python_exe`
+    with one of `module`, `code` or `script`, followed by `args`.
     """
     if sum(1 for kw in (module, code, script) if kw is not None) != 1:
         raise RuntimeError(
@@ -180,10 +601,124 @@ def run_python_with_args(
 
     if args is not None:
         cmd_list.extend(args)
+    return cmd_list
+
+
+def run_python_with_args(
+    *, python_exe, args=None, module=None, code=None, script=None,
+    input=None,  # pylint: disable=redefined-builtin
+    stdin=None, stdout=PIPE, stderr=PIPE, timeout=None, env=None
+):
+    """
+    Wrapper around subprocess.run for calling python interpreter.
+    """
+    import subprocess  # pylint: disable=import-outside-toplevel
+    cmd_list = python_command(
+        python_exe=python_exe, args=args, module=module, code=code,
+        script=script,
+    )
 
     log.debug("Running command %s", cmd_list)
 
-    return subprocess.run(
-        cmd_list, input=input, stdin=stdin, stdout=stdout, stderr=stderr,
-        timeout=timeout, shell=False, universal_newlines=True, check=True
+    with record("python", cmd_list) as recorder:
+        result = subprocess.run(
+            cmd_list, input=input, stdin=stdin, stdout=stdout, stderr=stderr,
+            timeout=timeout, shell=False, universal_newlines=True, check=True,
+            env=env
+        )
+        recorder.set_result(result.returncode, result.stdout, result.stderr)
+    return result
+
+
+def _pipe_lines(name, pipe, lines):
+    """
+    Put each line from `pipe` on the queue `lines` tagged with `name`,
+    followed by `None` once the pipe is closed.
+    """
+    with pipe:
+        for line in iter(pipe.readline, ""):
+            lines.put((name, line))
+    lines.put(None)
+
+
+def _write_input(pipe, input):  # pylint: disable=redefined-builtin
+    try:
+        with pipe:
+            pipe.write(input)
+    except BrokenPipeError:
+        pass
+
+
+def stream_python_with_args(
+    *, python_exe, args=None, module=None, code=None, script=None,
+    input=None,  # pylint: disable=redefined-builtin
+    env=None
+):
+    """
+    Call the python interpreter, yielding each line of output as it is
+    written, as a tuple of the name of the stream ("stdout" or "stderr") and
+    the line.
+
+    Raises `subprocess.CalledProcessError` once the output is exhausted if
+    the exit status is non-zero. If the generator is closed before then, the
+    process is killed.
+    """
+    # pylint: disable=import-outside-toplevel
+    import queue
+    import subprocess
+    cmd_list = python_command(
+        python_exe=python_exe, args=args, module=module, code=code,
+        script=script,
     )
+
+    log.debug("Streaming command %s", cmd_list)
+
+    # the output is not captured, so only the exit status is recorded
+    with record("python", cmd_list) as recorder:
+        process = subprocess.Popen(
+            cmd_list, stdin=subprocess.PIPE if input is not None else None,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, env=env
+        )
+        # bounded, so a slow consumer causes the process to block rather than
+        # the output being buffered in memory
+        lines = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        threads = [
+            threading.Thread(
+                target=_pipe_lines, args=("stdout", process.stdout, lines)
+            ),
+            threading.Thread(
+                target=_pipe_lines, args=("stderr", process.stderr, lines)
+            ),
+        ]
+        if input is not None:
+            threads.append(threading.Thread(
+                target=_write_input, args=(process.stdin, input)
+            ))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            open_pipes = 2
+            while open_pipes:
+                line = lines.get()
+                if line is None:
+                    open_pipes -= 1
+                else:
+                    yield line
+            process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+            for thread in threads:
+                while thread.is_alive():
+                    # unblock readers waiting for space in the queue
+                    try:
+                        lines.get_nowait()
+                    except queue.Empty:
+                        thread.join(0.01)
+            recorder.set_result(process.returncode)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, cmd_list)
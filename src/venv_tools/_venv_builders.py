@@ -9,10 +9,10 @@ EnvBuilder replacement classes for where EnvBuilder isn't available.
 :license: BSD, see LICENSE for more details.
 """
 import sys
-import shlex
-import subprocess
 import logging
 
+from ._events import record
+
 log = logging.getLogger(__name__)
 
 VIRTUALENV_COMMAND = "virtualenv {options} {env_dir}"
@@ -30,8 +30,11 @@ class VirtualenvBuilder(object):
         self.with_pip = with_pip
         self.path_to_python_exe = path_to_python_exe or sys.executable
 
-    def create(self, env_dir):
-        # pylint: disable=missing-docstring
+    def command(self, env_dir):
+        """
+        The command which creates a virtualenv at `env_dir`.
+        """
+        import shlex  # pylint: disable=import-outside-toplevel
         options = ""
         options += " --python {python} ".format(python=self.path_to_python_exe)
         if self.system_site_packages:
@@ -41,8 +44,14 @@ class VirtualenvBuilder(object):
         if not self.with_pip:
             options += " --no-setuptools --no-pip "
         log.debug("virtualenv options: {}".format(options))
-        subprocess.check_output(
-            shlex.split(VIRTUALENV_COMMAND.format(
-                options=options, env_dir=env_dir
-            )), stderr=subprocess.STDOUT
-        )
+        return shlex.split(VIRTUALENV_COMMAND.format(
+            options=options, env_dir=env_dir
+        ))
+
+    def create(self, env_dir):
+        # pylint: disable=missing-docstring,import-outside-toplevel
+        import subprocess
+        cmd = self.command(env_dir)
+        with record("virtualenv", cmd, env_dir) as recorder:
+            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            recorder.set_result(0, output)
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._worker
+~~~~~~~~~~
+
+Long-running python interpreters inside venvs, which avoid paying
+interpreter startup for each call.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import json
+from logging import getLogger
+import os
+import os.path as pth
+import queue
+import signal
+import subprocess
+import threading
+
+from ._events import record
+from ._utils import python_command
+
+WORKER_SERVER_PATH = pth.join(pth.dirname(__file__), "_worker_server.py")
+
+log = getLogger(__name__)
+
+
+class WorkerCompletedProcess(subprocess.CompletedProcess):
+    """
+    A `subprocess.CompletedProcess` which also records how long the worker
+    spent on the request. `timings` maps the stage of the request to the
+    time in seconds, with `run` being the time spent running the code.
+    """
+    def __init__(
+        self, args, returncode, stdout=None, stderr=None, timings=None
+    ):
+        super().__init__(args, returncode, stdout, stderr)
+        self.timings = timings or {}
+
+
+class _PythonCaller(object):
+    """
+    Provides the `call_python_*` methods, given a `run` method which takes
+    the arguments to the python interpreter.
+    """
+    def _call(self, args, input, timeout, **kwargs):
+        # pylint: disable=redefined-builtin
+        cmd_list = python_command(
+            python_exe=self.python_exe, args=args, **kwargs
+        )
+        return self.run(cmd_list[1:], input=input, timeout=timeout)
+
+    def call_python_file(
+        self, filename, *args, input=None,  # pylint: disable=redefined-builtin
+        timeout=None
+    ):
+        """
+        Call a python file with a worker interpreter.
+        """
+        return self._call(args, input, timeout, script=filename)
+
+    def call_python_module(
+        self, module_name, *args,
+        input=None,  # pylint: disable=redefined-builtin
+        timeout=None
+    ):
+        """
+        Call a python module with a worker interpreter.
+        """
+        return self._call(args, input, timeout, module=module_name)
+
+    def call_python_code(
+        self, code, *args, input=None,  # pylint: disable=redefined-builtin
+        timeout=None
+    ):
+        """
+        Call some python code with a worker interpreter.
+        """
+        return self._call(args, input, timeout, code=code)
+
+
+class VenvWorker(_PythonCaller):
+    """
+    Context manager around a long-running python interpreter, which runs
+    code, modules and scripts on request.
+
+    The `call_python_*` methods behave like their equivalents on `Venv`,
+    returning a `subprocess.CompletedProcess` with the output and exit
+    status, and raising `subprocess.CalledProcessError` if the exit status is
+    non-zero. Requests are run one at a time.
+
+    .. warning::
+        All requests run in the same interpreter, so anything done by one
+        request (such as importing modules or changing global state) is
+        visible to later requests. Only output written via `sys.stdout` and
+        `sys.stderr` is captured, output written directly to the underlying
+        file descriptors (e.g. by subprocesses) goes to the stderr of the
+        worker.
+
+    If a request causes the interpreter to exit, or times out, the
+    interpreter is restarted for the next request.
+
+    :param str python_exe: The path to the python interpreter to use.
+    :param dict env: The environment for the interpreter. Defaults to the
+        current environment.
+    """
+    def __init__(self, python_exe, env=None):
+        self._python_exe = python_exe
+        self._env = env
+        self._process = None
+        self._lock = threading.Lock()
+        self._tasks_run = 0
+        self._rss = None
+        self._preload_timings = {}
+
+    @property
+    def python_exe(self):
+        """
+        Path to python interpreter
+        """
+        return self._python_exe
+
+    @property
+    def pid(self):
+        """
+        The process id of the interpreter, or `None` if it is not running.
+        """
+        if self._process is None:
+            return None
+        return self._process.pid
+
+    @property
+    def tasks_run(self):
+        """
+        The number of requests run by the current interpreter.
+        """
+        return self._tasks_run
+
+    @property
+    def rss(self):
+        """
+        The resident memory in bytes of the interpreter after the last
+        request, or `None` if it is not known.
+        """
+        return self._rss
+
+    @property
+    def preload_timings(self):
+        """
+        How long in seconds each preloaded module took to import when the
+        interpreter was started.
+        """
+        return dict(self._preload_timings)
+
+    def _server_command(self):
+        return [self.python_exe, WORKER_SERVER_PATH]
+
+    def _read_response(self):
+        line = self._process.stdout.readline()
+        if not line:
+            return None
+        return json.loads(line.decode("ascii"))
+
+    def _start(self):
+        cmd = self._server_command()
+        log.debug("Starting worker %s", cmd)
+        # the interpreter leads its own process group, so that it can be
+        # killed along with any children it has forked
+        self._process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self._env,
+            start_new_session=hasattr(os, "killpg"),
+        )
+        self._tasks_run = 0
+        self._rss = None
+        hello = self._read_response()
+        if hello is None:
+            self._process.wait()
+            returncode = self._process.returncode
+            self._process = None
+            raise RuntimeError(
+                "Worker failed to start (exit status {})".format(returncode)
+            )
+        self._preload_timings = hello.get("preload", {})
+
+    @staticmethod
+    def _kill(process):
+        """
+        Kill the interpreter, and any children it has forked.
+        """
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+
+    def _stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.stdin.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            process.wait()
+        process.stdout.close()
+
+    def start(self):
+        """
+        Start the interpreter, if it is not already running.
+        """
+        with self._lock:
+            if self._process is None:
+                self._start()
+
+    def close(self):
+        """
+        Stop the interpreter.
+        """
+        with self._lock:
+            self._stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _request(self, request, timeout):
+        """
+        Send `request` to the interpreter, returning the response and whether
+        the request timed out. The response is `None` if the interpreter
+        exited or was killed.
+        """
+        if self._process is None:
+            self._start()
+        process = self._process
+        timed_out = []
+        timer = None
+        if timeout is not None:
+            def _kill():
+                timed_out.append(True)
+                self._kill(process)
+            timer = threading.Timer(timeout, _kill)
+            timer.start()
+        try:
+            process.stdin.write(json.dumps(request).encode("ascii") + b"\n")
+            process.stdin.flush()
+            response = self._read_response()
+        except BrokenPipeError:
+            response = None
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return response, bool(timed_out)
+
+    def run(
+        self, argv, input=None,  # pylint: disable=redefined-builtin
+        timeout=None
+    ):
+        """
+        Run the equivalent of calling the interpreter with the arguments
+        `argv`.
+        """
+        args = [self.python_exe] + list(argv)
+        log.debug("Running command %s in worker", args)
+        with record("python", args) as recorder:
+            with self._lock:
+                response, timed_out = self._request(
+                    {"argv": list(argv), "input": input}, timeout
+                )
+                self._tasks_run += 1
+                if response is None:
+                    returncode = self._process.wait()
+                    self._stop()
+                    if timed_out:
+                        raise subprocess.TimeoutExpired(args, timeout)
+                    response = {
+                        "returncode": returncode, "stdout": "", "stderr": ""
+                    }
+                else:
+                    self._rss = response.get("rss")
+            result = WorkerCompletedProcess(
+                args, response["returncode"], response["stdout"],
+                response["stderr"], timings=response.get("timings"),
+            )
+            recorder.set_result(
+                result.returncode, result.stdout, result.stderr
+            )
+            result.check_returncode()
+        return result
+
+
+class VenvZygote(VenvWorker):
+    """
+    A `VenvWorker` which imports `preload` on startup, and then forks a child
+    for each request.
+
+    Each request runs in its own copy of the interpreter, so requests cannot
+    affect each other, but the cost of starting the interpreter and
+    importing the preloaded modules is only paid once. How long the imports
+    took is available from `preload_timings`, and each result has `timings`
+    for the `fork`, `run` and `total` time of the request.
+
+    Only available on platforms which support `os.fork`.
+
+    :param str python_exe: The path to the python interpreter to use.
+    :param preload: The names of modules to import before forking.
+    :param dict env: The environment for the interpreter. Defaults to the
+        current environment.
+    """
+    def __init__(self, python_exe, preload=(), env=None):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Zygote mode requires os.fork.")
+        super().__init__(python_exe, env=env)
+        self._preload = list(preload)
+
+    @property
+    def preload(self):
+        """
+        The modules imported before forking
+        """
+        return list(self._preload)
+
+    def _server_command(self):
+        cmd = super()._server_command() + ["--fork"]
+        if self._preload:
+            cmd.extend(["--preload", ",".join(self._preload)])
+        return cmd
+
+
+class VenvWorkerPool(_PythonCaller):
+    """
+    Context manager around a pool of `VenvWorker`, so that calls can be run
+    in parallel.
+
+    The `call_python_*` methods can be called from multiple threads, and each
+    call is run by an idle worker (waiting for one to become idle if needed).
+    A worker is restarted once it has run `max_tasks_per_child` requests, or
+    its resident memory exceeds `max_rss` bytes.
+
+    :param str python_exe: The path to the python interpreter to use.
+    :param int size: The number of workers. Defaults to the number of CPUs.
+    :param int max_tasks_per_child: The number of requests a worker runs
+        before being restarted. Defaults to no limit.
+    :param int max_rss: The resident memory in bytes above which a worker is
+        restarted. Defaults to no limit.
+    :param dict env: The environment for the interpreters. Defaults to the
+        current environment.
+    """
+    def __init__(
+        self, python_exe, size=None, max_tasks_per_child=None, max_rss=None,
+        env=None
+    ):
+        self._python_exe = python_exe
+        self._size = size or os.cpu_count() or 1
+        self._max_tasks_per_child = max_tasks_per_child
+        self._max_rss = max_rss
+        self._workers = [
+            VenvWorker(python_exe, env=env) for _ in range(self._size)
+        ]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        # guards _restarts and _closed, which are used from any thread
+        # calling run
+        self._lock = threading.Lock()
+        self._restarts = []
+        self._closed = False
+
+    @property
+    def python_exe(self):
+        """
+        Path to python interpreter
+        """
+        return self._python_exe
+
+    @property
+    def size(self):
+        """
+        The number of workers
+        """
+        return self._size
+
+    def start(self):
+        """
+        Start all the workers.
+        """
+        with self._lock:
+            self._closed = False
+        for worker in self._workers:
+            worker.start()
+
+    def close(self):
+        """
+        Stop all the workers, after waiting for any being restarted. The
+        pool cannot be used again until `start` is called.
+        """
+        with self._lock:
+            self._closed = True
+            restarts, self._restarts = self._restarts, []
+        for restart in restarts:
+            restart.join()
+        for worker in self._workers:
+            worker.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _needs_restart(self, worker):
+        if self._max_tasks_per_child is not None:
+            if worker.tasks_run >= self._max_tasks_per_child:
+                return True
+        if self._max_rss is not None and worker.rss is not None:
+            return worker.rss > self._max_rss
+        return False
+
+    def _restart(self, worker):
+        log.debug("Restarting worker %s", worker.pid)
+        worker.close()
+        try:
+            worker.start()
+        finally:
+            self._idle.put(worker)
+
+    def run(
+        self, argv, input=None,  # pylint: disable=redefined-builtin
+        timeout=None
+    ):
+        """
+        Run the equivalent of calling the interpreter with the arguments
+        `argv`, using an idle worker.
+        """
+        if self._closed:
+            raise RuntimeError("VenvWorkerPool has been closed.")
+        worker = self._idle.get()
+        try:
+            return worker.run(argv, input=input, timeout=timeout)
+        finally:
+            self._release(worker)
+
+    def _release(self, worker):
+        """
+        Return `worker` to the idle workers, restarting it first if needed
+        (unless the pool has been closed).
+        """
+        with self._lock:
+            if not self._closed and self._needs_restart(worker):
+                restart = threading.Thread(
+                    target=self._restart, args=(worker,)
+                )
+                self._restarts = [
+                    t for t in self._restarts if t.is_alive()
+                ] + [restart]
+                restart.start()
+                return
+        self._idle.put(worker)
+
+    def map_python_code(self, codes, *args, timeout=None):
+        """
+        Call each of `codes` with the arguments `args`, spreading the calls
+        across the workers. Returns the results in the same order as `codes`.
+        """
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(
+                lambda code: self.call_python_code(
+                    code, *args, timeout=timeout
+                ),
+                codes
+            ))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+venv_tools._worker_server
+~~~~~~~~~~
+
+Server run inside a venv by `venv_tools._worker.VenvWorker`.
+
+This is run as a script by the venv's python interpreter, so must not import
+anything from venv_tools, and must work on any python version a venv might
+use (python 2.7 and python 3).
+
+Requests and responses are JSON objects, one per line. Requests are read from
+stdin and contain the command line arguments that would have been passed to
+the python interpreter (`argv`) and the text for stdin (`input`). Responses
+are written to stdout and contain `returncode`, `stdout`, `stderr`, the
+resident memory of the server in bytes (`rss`) and how long the request took
+(`timings`). Once the server has started it writes a response containing its
+`pid` and how long each preloaded module took to import (`preload`).
+
+Options:
+
+``--preload mod1,mod2``
+    Import the given modules before serving requests.
+``--fork``
+    Run each request in a forked child of the server, so requests are
+    isolated from each other but share the preloaded modules.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import print_function
+
+import io
+import json
+import os
+import os.path
+import runpy
+import sys
+import time
+import traceback
+
+# time.perf_counter is python 3.3+, use it where available
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class _Capture(io.StringIO):
+    """
+    Buffer for captured output, which survives being closed by the code being
+    run (as happens when a tool closes sys.stdout). Byte strings (as written
+    by python 2) are decoded as UTF-8.
+    """
+    def write(self, s):
+        if isinstance(s, bytes):
+            s = s.decode("utf8", "replace")
+        return super(_Capture, self).write(s)
+
+    def close(self):
+        pass
+
+
+def _rss():
+    """
+    The resident memory of this process in bytes, or `None` if it cannot be
+    found. Where the current value is not available, the peak is used.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return maxrss
+    return maxrss * 1024
+
+
+def _exit_code(exc):
+    """
+    Convert a `SystemExit` into an exit code, as the interpreter would.
+    """
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def _user_traceback(tb):
+    """
+    Skip the frames of this server (and of runpy) at the start of the
+    traceback `tb`, so it is printed as the interpreter would print it.
+    """
+    while tb is not None:
+        frame_globals = tb.tb_frame.f_globals
+        if frame_globals is not globals():
+            if frame_globals.get("__name__") != "runpy":
+                break
+        tb = tb.tb_next
+    return tb
+
+
+def _run(argv):
+    """
+    Run the equivalent of `python *argv`.
+    """
+    if argv[0] == "-c":
+        sys.argv = ["-c"] + argv[2:]
+        sys.path[0] = ""
+        # don't pass on the __future__ imports of this module
+        code = compile(argv[1], "<string>", "exec", dont_inherit=True)
+        exec(code, {"__name__": "__main__"})  # pylint: disable=exec-used
+    elif argv[0] == "-m":
+        sys.argv = argv[1:]
+        sys.path[0] = os.getcwd()
+        runpy.run_module(argv[1], run_name="__main__", alter_sys=True)
+    else:
+        sys.argv = list(argv)
+        sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+        runpy.run_path(argv[0], run_name="__main__")
+
+
+def handle_request(request):
+    """
+    Run a single request, capturing its output.
+    """
+    saved = (sys.argv, list(sys.path), sys.stdin, sys.stdout, sys.stderr)
+    sys.stdin = io.StringIO(request.get("input") or u"")
+    stdout = sys.stdout = _Capture()
+    stderr = sys.stderr = _Capture()
+    returncode = 0
+    start = _clock()
+    try:
+        _run(request["argv"])
+    except SystemExit as e:
+        returncode = _exit_code(e)
+    except BaseException:  # pylint: disable=broad-except
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, _user_traceback(tb))
+        returncode = 1
+    response = {
+        "returncode": returncode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "rss": _rss(),
+        "timings": {"run": _clock() - start},
+    }
+    sys.argv, sys.path[:], sys.stdin, sys.stdout, sys.stderr = saved
+    return response
+
+
+def handle_request_forked(request, protocol_files=()):
+    """
+    Run a single request in a forked child, capturing its output. The child
+    closes `protocol_files`, so that the client sees the end of the protocol
+    stream if the server is killed while the child is running.
+    """
+    start = _clock()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            for protocol_file in protocol_files:
+                os.close(protocol_file.fileno())
+            os.close(read_fd)
+            forked = _clock()
+            response = handle_request(request)
+            response["timings"]["fork"] = forked - start
+            with os.fdopen(write_fd, "wb") as f:
+                f.write(json.dumps(response).encode("ascii"))
+            exit_code = 0
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        data = f.read()
+    _, status = os.waitpid(pid, 0)
+    if data:
+        response = json.loads(data.decode("ascii"))
+    else:
+        # the child exited before it could respond
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        response = {
+            "returncode": returncode, "stdout": "", "stderr": "",
+            "rss": None, "timings": {},
+        }
+    response["rss"] = _rss()
+    response["timings"]["total"] = _clock() - start
+    return response
+
+
+def preload(modules):
+    """
+    Import `modules`, returning how long each took to import.
+    """
+    timings = {}
+    for module in modules:
+        start = _clock()
+        __import__(module)
+        timings[module] = _clock() - start
+    return timings
+
+
+def write_response(proto_out, response):
+    """
+    Write a response to the client.
+    """
+    proto_out.write(json.dumps(response).encode("ascii") + b"\n")
+    proto_out.flush()
+
+
+def main():
+    """
+    Serve requests until stdin is closed.
+    """
+    # Keep stdin and stdout for the protocol, and stop anything writing
+    # directly to the file descriptors from corrupting it.
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    args = sys.argv[1:]
+    fork = "--fork" in args
+    modules = []
+    if "--preload" in args:
+        modules = [
+            module for module in args[args.index("--preload") + 1].split(",")
+            if module
+        ]
+    sys.path[0] = ""
+    preload_timings = preload(modules)
+
+    write_response(
+        proto_out, {"pid": os.getpid(), "preload": preload_timings}
+    )
+    # python 2 file iteration reads ahead, which would wait for more requests
+    for line in iter(proto_in.readline, b""):
+        request = json.loads(line.decode())
+        if fork:
+            response = handle_request_forked(request, (proto_in, proto_out))
+        else:
+            response = handle_request(request)
+        write_response(proto_out, response)
+
+
+if __name__ == "__main__":
+    main()
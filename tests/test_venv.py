@@ -1,18 +1,67 @@
+import asyncio
+import json
 import os
 import sys
 import shutil
 import tempfile
+import threading
+import time
 import subprocess
 
 import unittest
+from urllib.request import urlopen
 
-from venv_tools import Venv, TemporaryVenv
-from venv_tools._utils import is_venv, is_virtualenv
+from venv_tools import (
+    Venv, TemporaryVenv, TemporaryVenvPool, TemplateCache, VenvStore,
+    AsyncVenv, AsyncTemporaryVenv, VenvGroup, find_venvs,
+    get_interpreter_info, add_listener, remove_listener, TraceRecorder,
+    Metrics, Event, BackgroundTeardown, VenvWorker,
+    VenvZygote,
+)
+from venv_tools._config import parse_pyvenv_cfg
+from venv_tools._interpreter import clear_interpreter_cache
+from venv_tools._dists import clear_distributions_cache, read_distributions
+from venv_tools._teardown import remove_tree
+from venv_tools._utils import (
+    is_venv, is_virtualenv, BIN_DIR, parse_pip_install_output,
+    clear_venv_cache, abspath_path_executable, abspath_path_executables,
+    clear_path_cache, select_temp_dir, TMPFS_DIR, requirement_pin,
+    strip_requirement_comment, StatCache, NOT_CACHED,
+)
+
+from wheels import make_wheel
 
 VENV_PYTHON_TEST_CODE = "from __future__ import print_function; import sys; print(sys.prefix)"
 DEVNULL = open(os.devnull, "w")
 SYS_TEST_CODE = "from __future__ import print_function; import sys; print(sys.version_info)"
 
+def process_running(pid):
+    """
+    Whether the process `pid` exists and is not a zombie.
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def python2_exe():
+    """
+    The path to a working python 2 interpreter, or `None` if there is not one.
+    """
+    try:
+        return subprocess.check_output(
+            ["python2", "-c", "import sys; print sys.executable"],
+            stderr=DEVNULL, universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
 def pyvenv_exists():
     try:
         subprocess.call(["python3", "-m", "venv"], stdout=DEVNULL, stderr=DEVNULL)
@@ -131,3 +180,1259 @@ class TestTemporaryVenv(unittest.TestCase):
                         "python", "-c", SYS_TEST_CODE
                     ], universal_newlines=True).strip())
                 )
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = TemplateCache(cache_dir=self.cache_dir)
+
+    def test_clone_via_is_venv(self):
+        with TemporaryVenv(template_cache=self.cache) as envdir:
+            self.assertTrue(is_venv(envdir))
+
+    def test_template_reused(self):
+        with TemporaryVenv(template_cache=self.cache):
+            pass
+        with TemporaryVenv(template_cache=self.cache):
+            pass
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_clone_via_sys(self):
+        with TemporaryVenv(template_cache=self.cache):
+            pass
+        with TemporaryVenv(template_cache=self.cache) as envdir:
+            venv = Venv(envdir)
+            self.assertEqual(
+                venv.call_python_code(VENV_PYTHON_TEST_CODE).stdout.strip(),
+                envdir
+            )
+            with open(os.path.join(envdir, BIN_DIR, "activate")) as f:
+                self.assertIn(envdir, f.read())
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+class TestTemporaryVenvPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = TemporaryVenvPool(size=2)
+
+    def test_via_is_venv(self):
+        with self.pool as envdir:
+            self.assertTrue(is_venv(envdir))
+
+    def test_nested(self):
+        with self.pool as outer:
+            with self.pool as inner:
+                self.assertNotEqual(outer, inner)
+                self.assertTrue(is_venv(inner))
+            self.assertTrue(is_venv(outer))
+
+    def test_removed_on_close(self):
+        with self.pool as envdir:
+            pass
+        self.pool.close()
+        self.assertFalse(os.path.exists(envdir))
+
+    def test_closed(self):
+        self.pool.close()
+        self.assertRaises(RuntimeError, self.pool.__enter__)
+
+    def test_exit_without_close(self):
+        parent = tempfile.mkdtemp()
+        try:
+            subprocess.check_call([
+                sys.executable, "-c",
+                "import sys, venv_tools\n"
+                "with venv_tools.TemporaryVenvPool(size=2, dir=sys.argv[1]):\n"
+                "    pass\n",
+                parent,
+            ], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+            self.assertEqual(os.listdir(parent), [])
+        finally:
+            shutil.rmtree(parent)
+
+    def test_garbage_collected(self):
+        parent = tempfile.mkdtemp()
+        try:
+            pool = TemporaryVenvPool(size=2, dir=parent)
+            with pool:
+                pass
+            # the venv being created to refill the pool keeps it alive until
+            # it is ready
+            del pool
+            deadline = time.time() + 60
+            while os.listdir(parent) and time.time() < deadline:
+                time.sleep(0.1)
+            self.assertEqual(os.listdir(parent), [])
+        finally:
+            shutil.rmtree(parent)
+
+    def tearDown(self):
+        self.pool.close()
+
+class TestVenvStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.wheel_dir = tempfile.mkdtemp()
+        self.wheel = make_wheel(self.wheel_dir, "venv_tools_test_pkg", "1.0")
+        self.store = VenvStore(root=self.root)
+
+    def test_build(self):
+        venv = self.store.get([self.wheel])
+        self.assertTrue(is_venv(venv.env_dir))
+        self.assertEqual(
+            venv.call_python_code(
+                "import venv_tools_test_pkg as p; print(p.VERSION)"
+            ).stdout.strip(),
+            "1.0"
+        )
+        with open(os.path.join(venv.env_dir, BIN_DIR, "pip")) as f:
+            self.assertIn(venv.env_dir, f.readline())
+
+    def test_reused(self):
+        first = self.store.get([self.wheel])
+        second = self.store.get([" " + self.wheel, self.wheel])
+        self.assertEqual(first.env_dir, second.env_dir)
+        self.assertEqual(os.listdir(self.root), [os.path.basename(first.env_dir)])
+
+    def test_different_requirements(self):
+        self.assertNotEqual(
+            self.store.path_for([self.wheel]), self.store.path_for([])
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.wheel_dir)
+
+class TestInstallPackages(unittest.TestCase):
+    def setUp(self):
+        self.wheel_dir = tempfile.mkdtemp()
+        self.wheels = [
+            make_wheel(self.wheel_dir, "venv_tools_test_a", "1.0"),
+            make_wheel(self.wheel_dir, "venv_tools_test_b", "2.0"),
+        ]
+
+    def test_install(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            results = venv.install_packages(self.wheels)
+            self.assertEqual(
+                [(r.name, r.version, r.status) for r in results],
+                [
+                    ("venv-tools-test-a", "1.0", "installed"),
+                    ("venv-tools-test-b", "2.0", "installed"),
+                ]
+            )
+            venv.call_python_code(
+                "import venv_tools_test_a, venv_tools_test_b"
+            )
+
+    def test_parse_output(self):
+        output = (
+            "Requirement already satisfied: Foo_Bar>=1 in /x (from -r r) (1.2)\n"
+            "Collecting baz==3.0\n"
+            "Successfully installed baz-3.0\n"
+        )
+        self.assertEqual(
+            parse_pip_install_output(output, ["foo.bar>=1", "baz==3.0", "qux"]),
+            [
+                ("foo.bar>=1", "foo-bar", "1.2", "already-satisfied"),
+                ("baz==3.0", "baz", "3.0", "installed"),
+                ("qux", "qux", None, "unknown"),
+            ]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.wheel_dir)
+
+class TestVenvWorker(unittest.TestCase):
+    def setUp(self):
+        self.venv_dir = tempfile.mkdtemp()
+        subprocess.call(
+            ["virtualenv", self.venv_dir], stdout=DEVNULL, stderr=DEVNULL
+        )
+        self.venv = Venv(self.venv_dir)
+
+    def test_same_as_subprocess(self):
+        code = "import sys; print(sys.prefix, sys.argv[1:]); print(1, file=sys.stderr)"
+        expected = self.venv.call_python_code(code, "a", "b")
+        with self.venv.worker() as worker:
+            result = worker.call_python_code(code, "a", "b")
+        self.assertEqual(result.stdout, expected.stdout)
+        self.assertEqual(result.stderr, expected.stderr)
+        self.assertEqual(result.args, expected.args)
+
+        script = os.path.join(self.venv_dir, "fail.py")
+        with open(script, "w") as f:
+            f.write("def fail():\n    raise ValueError('x')\n\nfail()\n")
+        calls = [
+            ("call_python_code", "def f(): raise ValueError('x')\nf()"),
+            ("call_python_code", "1 +"),
+            ("call_python_file", script),
+        ]
+        with self.venv.worker() as worker:
+            for method, arg in calls:
+                with self.assertRaises(subprocess.CalledProcessError) as cm:
+                    getattr(self.venv, method)(arg)
+                expected = cm.exception
+                with self.assertRaises(subprocess.CalledProcessError) as cm:
+                    getattr(worker, method)(arg)
+                self.assertEqual(cm.exception.stderr, expected.stderr)
+
+    def test_single_interpreter(self):
+        with self.venv.worker() as worker:
+            pids = set(
+                worker.call_python_code("import os; print(os.getpid())").stdout
+                for _ in range(3)
+            )
+        self.assertEqual(len(pids), 1)
+
+    def test_module_and_input(self):
+        with self.venv.worker() as worker:
+            result = worker.call_python_module(
+                "json.tool", input='{"a": 1}'
+            )
+        self.assertEqual(result.stdout.split(), ["{", '"a":', "1", "}"])
+
+    def test_file(self):
+        script = os.path.join(self.venv_dir, "script.py")
+        with open(script, "w") as f:
+            f.write("import sys; print(sys.argv)")
+        with self.venv.worker() as worker:
+            result = worker.call_python_file(script, "x")
+        self.assertEqual(result.stdout.strip(), str([script, "x"]))
+
+    def test_failure(self):
+        with self.venv.worker() as worker:
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                worker.call_python_code("raise SystemExit(3)")
+            self.assertEqual(cm.exception.returncode, 3)
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                worker.call_python_code("1/0")
+            self.assertIn("ZeroDivisionError", cm.exception.stderr)
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                worker.call_python_code("import os; os._exit(4)")
+            self.assertEqual(cm.exception.returncode, 4)
+            self.assertEqual(worker.call_python_code("print(1)").stdout, "1\n")
+
+    def test_timeout(self):
+        with self.venv.worker() as worker:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                worker.call_python_code("while True: pass", timeout=0.5)
+            self.assertEqual(worker.call_python_code("print(1)").stdout, "1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.venv_dir)
+
+@unittest.skipIf(python2_exe() is None, "No python 2 interpreter")
+class TestVenvWorkerPython2(unittest.TestCase):
+    def test_worker(self):
+        code = (
+            "import sys; print 'hello', sys.version_info[0]; "
+            "sys.stdout.write(sys.stdin.read()); sys.stderr.write('err')"
+        )
+        workers = [VenvWorker(python2_exe())]
+        if hasattr(os, "fork"):
+            workers.append(VenvZygote(python2_exe()))
+        for worker in workers:
+            with worker:
+                result = worker.call_python_code(code, input="in\n")
+            self.assertEqual(result.stdout, "hello 2\nin\n")
+            self.assertEqual(result.stderr, "err")
+
+class TestVenvWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.venv_dir = tempfile.mkdtemp()
+        subprocess.call(
+            ["virtualenv", self.venv_dir], stdout=DEVNULL, stderr=DEVNULL
+        )
+        self.venv = Venv(self.venv_dir)
+
+    def test_map(self):
+        with self.venv.worker_pool(size=2) as pool:
+            results = pool.map_python_code(
+                ["print({})".format(i) for i in range(10)]
+            )
+        self.assertEqual(
+            [r.stdout for r in results], ["{}\n".format(i) for i in range(10)]
+        )
+
+    def test_max_tasks_per_child(self):
+        with self.venv.worker_pool(size=1, max_tasks_per_child=2) as pool:
+            pids = [
+                pool.call_python_code("import os; print(os.getpid())").stdout
+                for _ in range(4)
+            ]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(pids[2], pids[3])
+
+    def test_max_rss(self):
+        with self.venv.worker_pool(size=1, max_rss=1) as pool:
+            first = pool.call_python_code("import os; print(os.getpid())")
+            second = pool.call_python_code("import os; print(os.getpid())")
+        self.assertNotEqual(first.stdout, second.stdout)
+
+    def test_close_while_restarting(self):
+        pool = self.venv.worker_pool(size=2, max_tasks_per_child=1)
+        pool.start()
+        threads = [
+            threading.Thread(target=pool.call_python_code, args=("pass",))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.close()
+        time.sleep(0.5)
+        self.assertEqual([worker.pid for worker in pool._workers], [None] * 2)
+
+    def test_closed(self):
+        with self.venv.worker_pool(size=1) as pool:
+            pass
+        self.assertRaises(RuntimeError, pool.call_python_code, "pass")
+        self.assertIsNone(pool._workers[0].pid)
+
+    def tearDown(self):
+        shutil.rmtree(self.venv_dir)
+
+@unittest.skipIf(not hasattr(os, "fork"), "Zygote requires fork")
+class TestVenvZygote(unittest.TestCase):
+    def setUp(self):
+        self.venv_dir = tempfile.mkdtemp()
+        subprocess.call(
+            ["virtualenv", self.venv_dir], stdout=DEVNULL, stderr=DEVNULL
+        )
+        self.venv = Venv(self.venv_dir)
+
+    def test_preloaded(self):
+        with self.venv.zygote(preload=["json"]) as zygote:
+            self.assertEqual(list(zygote.preload_timings), ["json"])
+            result = zygote.call_python_code(
+                "import sys; print('json' in sys.modules)"
+            )
+        self.assertEqual(result.stdout, "True\n")
+        self.assertIn("run", result.timings)
+        self.assertIn("fork", result.timings)
+
+    def test_isolated(self):
+        with self.venv.zygote() as zygote:
+            zygote.call_python_code("import sys; sys.isolated_test = 1")
+            result = zygote.call_python_code(
+                "import sys, os; print(hasattr(sys, 'isolated_test'), os.getpid())"
+            )
+            self.assertTrue(result.stdout.startswith("False"))
+            self.assertNotEqual(result.stdout.split()[1], str(zygote.pid))
+
+    def test_failure(self):
+        with self.venv.zygote() as zygote:
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                zygote.call_python_code("import os; os._exit(4)")
+            self.assertEqual(cm.exception.returncode, 4)
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                zygote.call_python_code("raise SystemExit('bad')")
+            self.assertEqual(cm.exception.returncode, 1)
+            self.assertEqual(cm.exception.stderr, "bad\n")
+
+    def test_timeout(self):
+        pid_file = os.path.join(self.venv_dir, "child.pid")
+        with self.venv.zygote() as zygote:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                zygote.call_python_code(
+                    "import os, time\n"
+                    "with open({!r}, 'w') as f: f.write(str(os.getpid()))\n"
+                    "while True: time.sleep(0.1)".format(pid_file),
+                    timeout=1,
+                )
+            self.assertEqual(zygote.call_python_code("print(1)").stdout, "1\n")
+        with open(pid_file) as f:
+            child = int(f.read())
+        for _ in range(50):
+            if not process_running(child):
+                break
+            time.sleep(0.1)
+        self.assertFalse(process_running(child))
+
+    def test_bad_preload(self):
+        zygote = self.venv.zygote(preload=["venv_tools_no_such_module"])
+        self.assertRaises(RuntimeError, zygote.start)
+
+    def tearDown(self):
+        shutil.rmtree(self.venv_dir)
+
+class TestAsync(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_temporary_venv(self):
+        async def create():
+            async with AsyncTemporaryVenv() as envdir:
+                self.assertTrue(is_venv(envdir))
+                result = await AsyncVenv(envdir).call_python_code(
+                    VENV_PYTHON_TEST_CODE
+                )
+                self.assertEqual(result.stdout.strip(), envdir)
+            return envdir
+        envdir = self.run_async(create())
+        self.assertFalse(os.path.exists(envdir))
+
+    def test_concurrent_calls(self):
+        async def call():
+            async with AsyncTemporaryVenv() as envdir:
+                venv = AsyncVenv(envdir)
+                return await asyncio.gather(*[
+                    venv.call_python_code("import sys; print(sys.argv[1])", str(i))
+                    for i in range(5)
+                ])
+        results = self.run_async(call())
+        self.assertEqual(
+            [r.stdout for r in results], ["{}\n".format(i) for i in range(5)]
+        )
+
+    def test_failure_and_timeout(self):
+        async def call():
+            async with AsyncTemporaryVenv() as envdir:
+                venv = AsyncVenv(envdir)
+                with self.assertRaises(subprocess.CalledProcessError):
+                    await venv.call_python_code("raise SystemExit(2)")
+                with self.assertRaises(subprocess.TimeoutExpired):
+                    await venv.call_python_code(
+                        "import time; time.sleep(10)", timeout=0.5
+                    )
+        self.run_async(call())
+
+    def test_temporary_venv_arguments(self):
+        base = tempfile.mkdtemp()
+        cache_dir = tempfile.mkdtemp()
+        events = []
+        add_listener(events.append)
+        try:
+            async def create():
+                async with AsyncTemporaryVenv(
+                    dir=base, prefix="pre-",
+                    template_cache=TemplateCache(cache_dir=cache_dir),
+                    teardown=teardown,
+                ) as envdir:
+                    self.assertEqual(os.path.dirname(envdir), base)
+                    self.assertTrue(
+                        os.path.basename(envdir).startswith("pre-")
+                    )
+                    self.assertTrue(is_venv(envdir))
+                    await AsyncVenv(envdir).call_python_code("pass")
+                return envdir
+            with BackgroundTeardown() as teardown:
+                envdir = self.run_async(create())
+                self.assertTrue(teardown.flush(timeout=60))
+            self.assertFalse(os.path.exists(envdir))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        finally:
+            remove_listener(events.append)
+            shutil.rmtree(base)
+            shutil.rmtree(cache_dir)
+        kinds = [event.kind for event in events if event.env_dir == envdir]
+        self.assertEqual(kinds, ["create", "delete"])
+        self.assertIn("python", [event.kind for event in events])
+
+    def test_timeout(self):
+        base = tempfile.mkdtemp()
+        cache_dir = tempfile.mkdtemp()
+        try:
+            async def create():
+                async with AsyncTemporaryVenv(
+                    template_cache=TemplateCache(cache_dir=cache_dir),
+                    timeout=0.005, dir=base,
+                ):
+                    pass
+            for _ in range(3):
+                with self.assertRaises(subprocess.TimeoutExpired):
+                    self.run_async(create())
+            # the abandoned builds remove their venvs once they finish
+            deadline = time.time() + 120
+            while os.listdir(base) and time.time() < deadline:
+                time.sleep(0.1)
+            self.assertEqual(os.listdir(base), [])
+        finally:
+            shutil.rmtree(base)
+            shutil.rmtree(cache_dir)
+
+    def test_virtualenv_events(self):
+        events = []
+        add_listener(events.append)
+        try:
+            async def create():
+                async with AsyncTemporaryVenv(use_virtualenv=True) as envdir:
+                    self.assertTrue(is_virtualenv(envdir))
+                return envdir
+            envdir = self.run_async(create())
+        finally:
+            remove_listener(events.append)
+        self.assertEqual(
+            [event.kind for event in events if event.env_dir == envdir],
+            ["virtualenv", "create", "delete"]
+        )
+
+    def tearDown(self):
+        self.loop.close()
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.venv_dir = tempfile.mkdtemp()
+        subprocess.call(
+            ["virtualenv", self.venv_dir], stdout=DEVNULL, stderr=DEVNULL
+        )
+        self.venv = Venv(self.venv_dir)
+
+    def test_stream(self):
+        lines = list(self.venv.stream_python_code(
+            "import sys\n"
+            "for i in range(3):\n"
+            "    print(i, flush=True)\n"
+            "print('err', file=sys.stderr)\n"
+        ))
+        self.assertEqual(
+            [line for line in lines if line[0] == "stdout"],
+            [("stdout", "0\n"), ("stdout", "1\n"), ("stdout", "2\n")]
+        )
+        self.assertIn(("stderr", "err\n"), lines)
+
+    def test_input(self):
+        lines = list(self.venv.stream_python_module("json.tool", input="[1]"))
+        self.assertEqual(lines, [("stdout", "[\n"), ("stdout", "    1\n"), ("stdout", "]\n")])
+
+    def test_failure(self):
+        stream = self.venv.stream_python_code("print(1); raise SystemExit(3)")
+        self.assertEqual(next(stream), ("stdout", "1\n"))
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            next(stream)
+        self.assertEqual(cm.exception.returncode, 3)
+
+    def test_close_early(self):
+        stream = self.venv.stream_python_code(
+            "while True: print('x' * 100, flush=True)"
+        )
+        for _, _ in zip(range(5000), stream):
+            pass
+        stream.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.venv_dir)
+
+class TestEnviron(unittest.TestCase):
+    def setUp(self):
+        self.venv_dir = tempfile.mkdtemp()
+        subprocess.call(
+            ["virtualenv", self.venv_dir], stdout=DEVNULL, stderr=DEVNULL
+        )
+        self.venv = Venv(self.venv_dir)
+
+    def test_not_mutating(self):
+        old_environ = dict(os.environ)
+        environ = self.venv.environ()
+        self.assertEqual(dict(os.environ), old_environ)
+        self.assertEqual(environ["VIRTUAL_ENV"], self.venv_dir)
+        self.assertTrue(
+            environ["PATH"].startswith(os.path.join(self.venv_dir, BIN_DIR))
+        )
+
+    def test_base(self):
+        environ = self.venv.environ({"PYTHONHOME": "/x", "OTHER": "y"})
+        self.assertEqual(environ, {
+            "PATH": os.path.join(self.venv_dir, BIN_DIR),
+            "VIRTUAL_ENV": self.venv_dir,
+            "OTHER": "y",
+        })
+
+    def test_passed_to_calls(self):
+        result = self.venv.call_python_code(
+            "import os; print(os.environ['VIRTUAL_ENV'])"
+        )
+        self.assertEqual(result.stdout.strip(), self.venv_dir)
+        self.assertNotEqual(os.environ.get("VIRTUAL_ENV"), self.venv_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.venv_dir)
+
+class TestVenvGroup(unittest.TestCase):
+    def setUp(self):
+        self.venv_dirs = [tempfile.mkdtemp() for _ in range(3)]
+        for venv_dir in self.venv_dirs:
+            subprocess.call(
+                ["virtualenv", venv_dir], stdout=DEVNULL, stderr=DEVNULL
+            )
+        self.group = VenvGroup(self.venv_dirs)
+
+    def test_map_python_code(self):
+        results = self.group.map_python_code(VENV_PYTHON_TEST_CODE, max_workers=2)
+        self.assertEqual(
+            [r.result.stdout.strip() for r in results], self.venv_dirs
+        )
+        self.assertTrue(all(r.error is None for r in results))
+        self.assertTrue(all(r.duration > 0 for r in results))
+
+    def test_errors(self):
+        results = self.group.map_python_code(
+            "import os, sys; sys.exit(os.environ['VIRTUAL_ENV'] == sys.argv[1])",
+            self.venv_dirs[1]
+        )
+        self.assertEqual(
+            [r.error is None for r in results], [True, False, True]
+        )
+        self.assertIsInstance(results[1].error, subprocess.CalledProcessError)
+
+    def tearDown(self):
+        for venv_dir in self.venv_dirs:
+            shutil.rmtree(venv_dir)
+
+class TestIsVenvCache(unittest.TestCase):
+    def setUp(self):
+        clear_venv_cache()
+        self.folder = tempfile.mkdtemp()
+
+    def touch(self, *path):
+        with open(os.path.join(self.folder, *path), "w") as f:
+            f.write("home = /usr/bin\n")
+
+    def test_pyvenv_cfg_added(self):
+        self.assertFalse(is_venv(self.folder))
+        self.touch("pyvenv.cfg")
+        self.assertTrue(is_venv(self.folder))
+        os.remove(os.path.join(self.folder, "pyvenv.cfg"))
+        self.assertFalse(is_venv(self.folder))
+
+    def test_bin_dir_changed(self):
+        os.mkdir(os.path.join(self.folder, BIN_DIR))
+        self.touch(BIN_DIR, "python")
+        self.assertFalse(is_venv(self.folder))
+        # make sure the modification time of the bin directory changes
+        bin_dir = os.path.join(self.folder, BIN_DIR)
+        stat = os.stat(bin_dir)
+        self.touch(BIN_DIR, "activate")
+        os.utime(bin_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(is_venv(self.folder))
+        self.assertTrue(is_virtualenv(self.folder))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+class TestStatCache(unittest.TestCase):
+    def test_key_changed(self):
+        cache = StatCache("test", 2)
+        cache.put("a", 1, "value")
+        self.assertEqual(cache.get("a", 1), "value")
+        self.assertIs(cache.get("a", 2), NOT_CACHED)
+        self.assertIs(cache.get("b", 1), NOT_CACHED)
+
+    def test_least_recently_used_evicted(self):
+        cache = StatCache("test", 2)
+        cache.put("a", 1, "a")
+        cache.put("b", 1, "b")
+        cache.get("a", 1)
+        cache.put("c", 1, "c")
+        self.assertEqual(cache.get("a", 1), "a")
+        self.assertIs(cache.get("b", 1), NOT_CACHED)
+        self.assertEqual(cache.get("c", 1), "c")
+
+    def test_events(self):
+        cache = StatCache("test", 2)
+        cache.put("a", 1, "a")
+        events = []
+        add_listener(events.append)
+        try:
+            cache.get("a", 1)
+            cache.get("a", 2)
+        finally:
+            remove_listener(events.append)
+        self.assertEqual(
+            [(e.kind, e.details) for e in events], [
+                ("cache", {"cache": "test", "hit": True}),
+                ("cache", {"cache": "test", "hit": False}),
+            ]
+        )
+
+class TestFindVenvs(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.venvs = []
+        for path in [("a",), ("b", "c"), ("b", "d", "e")]:
+            venv_dir = os.path.join(self.root, *path)
+            os.makedirs(venv_dir)
+            with open(os.path.join(venv_dir, "pyvenv.cfg"), "w") as f:
+                f.write("home = /usr/bin\n")
+            self.venvs.append(venv_dir)
+        # nested venvs and site-packages are not searched
+        for path in [("a", "nested"), ("b", "site-packages", "x")]:
+            venv_dir = os.path.join(self.root, *path)
+            os.makedirs(venv_dir)
+            with open(os.path.join(venv_dir, "pyvenv.cfg"), "w") as f:
+                f.write("home = /usr/bin\n")
+
+    def test_find(self):
+        self.assertEqual(
+            sorted(find_venvs(self.root, workers=4)), sorted(self.venvs)
+        )
+
+    def test_max_depth(self):
+        self.assertEqual(
+            sorted(find_venvs(self.root, max_depth=2)), sorted(self.venvs[:2])
+        )
+
+    def test_root_is_venv(self):
+        self.assertEqual(list(find_venvs(self.venvs[0])), [self.venvs[0]])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+class TestPyvenvConfig(unittest.TestCase):
+    def test_parse(self):
+        config = parse_pyvenv_cfg([
+            "home = /usr/bin\n",
+            "include-system-site-packages = true\n",
+            "version = 3.9.1\n",
+            "executable = /usr/bin/python3.9\n",
+            "prompt = 'my env'\n",
+            "command = /usr/bin/python3 -m venv /x\n",
+        ])
+        self.assertEqual(config.home, "/usr/bin")
+        self.assertTrue(config.include_system_site_packages)
+        self.assertEqual(config.version, "3.9.1")
+        self.assertEqual(config.executable, "/usr/bin/python3.9")
+        self.assertEqual(config.prompt, "my env")
+        self.assertEqual(config.extra, {"command": "/usr/bin/python3 -m venv /x"})
+
+    def test_virtualenv(self):
+        with TemporaryVenv(use_virtualenv=True) as envdir:
+            config = Venv(envdir).pyvenv_cfg
+            self.assertEqual(
+                config.version.split(".")[:3],
+                [str(v) for v in sys.version_info[:3]]
+            )
+            self.assertFalse(config.include_system_site_packages)
+
+    def test_missing(self):
+        folder = tempfile.mkdtemp()
+        try:
+            self.assertIsNone(Venv(folder).pyvenv_cfg)
+        finally:
+            shutil.rmtree(folder)
+
+class TestInterpreterInfo(unittest.TestCase):
+    def setUp(self):
+        clear_interpreter_cache()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def test_current(self):
+        info = get_interpreter_info(cache_dir=self.cache_dir)
+        self.assertEqual(info.version_info, tuple(sys.version_info))
+        self.assertEqual(info.prefix, sys.prefix)
+        self.assertTrue(info.has_venv)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_disk_cache(self):
+        info = get_interpreter_info(cache_dir=self.cache_dir)
+        # clear the in memory cache, so the result must come from disk
+        clear_interpreter_cache()
+        cache_file = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cache_file) as f:
+            data = f.read()
+        with open(cache_file, "w") as f:
+            f.write(data.replace(sys.prefix, "/cached"))
+        self.assertEqual(
+            get_interpreter_info(cache_dir=self.cache_dir).prefix, "/cached"
+        )
+        self.assertEqual(
+            info.version, get_interpreter_info(cache_dir=self.cache_dir).version
+        )
+
+    def test_venv(self):
+        with TemporaryVenv() as envdir:
+            info = Venv(envdir).interpreter_info
+            self.assertEqual(info.prefix, envdir)
+            self.assertEqual(info.base_prefix, sys.base_prefix)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+class TestPathLookup(unittest.TestCase):
+    def setUp(self):
+        clear_path_cache()
+        self.dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.old_path = os.environ["PATH"]
+        os.environ["PATH"] = os.pathsep.join(self.dirs)
+
+    def make_executable(self, directory, name):
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write("")
+        os.chmod(path, 0o755)
+        # make sure the modification time of the directory changes
+        stat = os.stat(directory)
+        os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        return path
+
+    def test_lookup(self):
+        second = self.make_executable(self.dirs[1], "tool")
+        self.assertEqual(abspath_path_executable("tool"), second)
+        self.assertEqual(abspath_path_executable("tool"), second)
+        first = self.make_executable(self.dirs[0], "tool")
+        self.assertEqual(abspath_path_executable("tool"), first)
+
+    def test_missing(self):
+        self.assertRaises(
+            FileNotFoundError, abspath_path_executable, "missing_tool"
+        )
+        path = self.make_executable(self.dirs[1], "missing_tool")
+        self.assertEqual(abspath_path_executable("missing_tool"), path)
+
+    def test_batch(self):
+        a = self.make_executable(self.dirs[0], "a")
+        b = self.make_executable(self.dirs[1], "b")
+        self.assertEqual(
+            abspath_path_executables(["a", "b", "c"]),
+            {"a": a, "b": b, "c": None}
+        )
+
+    def tearDown(self):
+        os.environ["PATH"] = self.old_path
+        for directory in self.dirs:
+            shutil.rmtree(directory)
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_lazy_modules(self):
+        # warnings is not included, as logging imports it
+        modules = [
+            "asyncio", "venv_tools._worker", "subprocess", "tempfile",
+            "shutil", "shlex", "queue",
+        ]
+        output = subprocess.check_output([
+            sys.executable, "-c",
+            "import sys, venv_tools; "
+            "print(*[name for name in sys.argv[1:] if name in sys.modules])",
+        ] + modules, universal_newlines=True, env=dict(
+            os.environ, PYTHONPATH=os.pathsep.join(sys.path)
+        ))
+        self.assertEqual(output.split(), [])
+
+    def test_pipe(self):
+        from venv_tools._utils import PIPE
+        self.assertEqual(PIPE, subprocess.PIPE)
+
+    def test_lazy_attributes(self):
+        import venv_tools
+        self.assertIs(venv_tools.VenvStore, VenvStore)
+        self.assertIn("find_venvs", dir(venv_tools))
+        self.assertIsInstance(venv_tools.__version__, str)
+        self.assertRaises(AttributeError, getattr, venv_tools, "missing")
+
+
+class TestEvents(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        add_listener(self.events.append)
+
+    def test_temporary_venv(self):
+        with TemporaryVenv() as env_dir:
+            venv = Venv(env_dir)
+            venv.call_python_code("print('hello')")
+            self.assertRaises(
+                subprocess.CalledProcessError, venv.call_python_code,
+                "import sys; sys.exit(3)"
+            )
+        kinds = [event.kind for event in self.events]
+        self.assertEqual(
+            kinds, ["virtualenv", "create", "python", "python", "delete"]
+        )
+        create, python, failed, delete = self.events[1:]
+        self.assertEqual(create.env_dir, env_dir)
+        self.assertEqual(delete.env_dir, env_dir)
+        self.assertEqual(python.returncode, 0)
+        self.assertEqual(python.stdout_bytes, len("hello\n"))
+        self.assertEqual(python.command[-1], "print('hello')")
+        self.assertEqual(failed.returncode, 3)
+        for event in self.events:
+            self.assertGreaterEqual(event.duration, 0)
+            self.assertEqual(event.thread_id, threading.get_ident())
+
+    def test_other_calls(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with TemporaryVenv() as env_dir:
+                venv = Venv(env_dir)
+                del self.events[:]
+                list(venv.stream_python_code("print(1)"))
+                with venv.worker() as worker:
+                    worker.call_python_code("print(1)")
+                with venv.worker_pool(size=1) as pool:
+                    pool.call_python_code("print(1)")
+                if hasattr(os, "fork"):
+                    with venv.zygote() as zygote:
+                        zygote.call_python_code("print(1)")
+                clear_interpreter_cache()
+                get_interpreter_info(venv.python_exe, cache_dir=cache_dir)
+        finally:
+            shutil.rmtree(cache_dir)
+        calls = [event for event in self.events if event.kind == "python"]
+        self.assertEqual(len(calls), 5 if hasattr(os, "fork") else 4)
+        for event in calls:
+            self.assertEqual(event.returncode, 0)
+        # the streamed output is not captured
+        self.assertIsNone(calls[0].stdout_bytes)
+        self.assertEqual(calls[1].stdout_bytes, 2)
+
+    def test_failing_listener(self):
+        def fail(event):
+            raise ValueError(event)
+        add_listener(fail)
+        try:
+            with TemporaryVenv():
+                pass
+        finally:
+            remove_listener(fail)
+        self.assertEqual(len(self.events), 3)
+
+    def tearDown(self):
+        remove_listener(self.events.append)
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def test_trace(self):
+        trace_dir = tempfile.mkdtemp()
+        try:
+            trace_file = os.path.join(trace_dir, "trace.json")
+            with TraceRecorder(trace_file):
+                with TemporaryVenv() as env_dir:
+                    Venv(env_dir).call_python_code("pass")
+            with open(trace_file) as f:
+                trace = json.load(f)
+        finally:
+            shutil.rmtree(trace_dir)
+        events = trace["traceEvents"]
+        self.assertEqual(
+            [event["name"] for event in events],
+            ["virtualenv", "create", "python", "delete"]
+        )
+        virtualenv, create = events[:2]
+        self.assertEqual(virtualenv["ph"], "X")
+        self.assertEqual(virtualenv["tid"], create["tid"])
+        # virtualenv is run within creating the venv
+        self.assertGreaterEqual(virtualenv["ts"], create["ts"])
+        self.assertLessEqual(
+            virtualenv["ts"] + virtualenv["dur"], create["ts"] + create["dur"]
+        )
+
+    def test_stops_recording(self):
+        with TraceRecorder() as recorder:
+            pass
+        with TemporaryVenv():
+            pass
+        self.assertEqual(recorder.events, [])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_metrics(self):
+        with Metrics() as metrics:
+            with TemporaryVenv() as env_dir:
+                venv = Venv(env_dir)
+                venv.call_python_code("pass")
+                self.assertRaises(
+                    subprocess.CalledProcessError, venv.call_python_code,
+                    "import sys; sys.exit(1)"
+                )
+                is_venv(env_dir)
+                is_venv(env_dir)
+        lines = metrics.render().splitlines()
+        self.assertIn(
+            'venv_tools_venv_creations_total{builder="venv_tools.'
+            '_venv_builders.VirtualenvBuilder",source="temporary"} 1', lines
+        )
+        self.assertIn("venv_tools_python_call_seconds_count 2", lines)
+        self.assertIn(
+            'venv_tools_python_call_seconds_bucket{le="+Inf"} 2', lines
+        )
+        self.assertIn("venv_tools_python_call_failures_total 1", lines)
+        self.assertIn("venv_tools_venv_teardown_seconds_count 1", lines)
+        self.assertIn(
+            'venv_tools_cache_requests_total{cache="is_venv",result="hit"} 1',
+            lines
+        )
+        self.assertIn("# TYPE venv_tools_install_seconds histogram", lines)
+
+    def test_export(self):
+        metrics = Metrics()
+        metrics(Event(
+            "python", ["python"], None, 0.0, 0.2, 0, 0, 0, 1, {}
+        ))
+        server = metrics.serve(("127.0.0.1", 0))
+        try:
+            with urlopen("http://127.0.0.1:{}/metrics".format(
+                server.server_address[1]
+            )) as response:
+                body = response.read().decode("utf8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(body, metrics.render())
+        self.assertIn(
+            'venv_tools_python_call_seconds_bucket{le="0.1"} 0', body
+        )
+        self.assertIn(
+            'venv_tools_python_call_seconds_bucket{le="0.25"} 1', body
+        )
+        metrics_dir = tempfile.mkdtemp()
+        try:
+            metrics_file = os.path.join(metrics_dir, "venv_tools.prom")
+            metrics.write(metrics_file)
+            with open(metrics_file) as f:
+                self.assertEqual(f.read(), body)
+        finally:
+            shutil.rmtree(metrics_dir)
+
+
+class TestTeardown(unittest.TestCase):
+    def setUp(self):
+        self.parent = tempfile.mkdtemp()
+
+    def make_tree(self, name):
+        root = os.path.join(self.parent, name)
+        for i in range(3):
+            path = os.path.join(root, "a{}".format(i), "b", "c")
+            os.makedirs(path)
+            for j in range(5):
+                with open(os.path.join(path, "f{}".format(j)), "w") as f:
+                    f.write("x")
+        os.symlink(self.parent, os.path.join(root, "link"))
+        return root
+
+    def test_remove_tree(self):
+        root = self.make_tree("tree")
+        remove_tree(root, workers=4)
+        self.assertEqual(os.listdir(self.parent), [])
+
+    def test_background(self):
+        with BackgroundTeardown(workers=2) as teardown:
+            roots = [self.make_tree("tree{}".format(i)) for i in range(3)]
+            for root in roots:
+                teardown.remove(root)
+                self.assertFalse(os.path.exists(root))
+            self.assertTrue(teardown.flush(timeout=60))
+            self.assertEqual(teardown.pending, 0)
+            self.assertEqual(os.listdir(self.parent), [])
+        self.assertRaises(RuntimeError, teardown.remove, self.parent)
+
+    def test_exit_without_flush(self):
+        for i in range(4):
+            self.make_tree("tree{}".format(i))
+        subprocess.check_call([
+            sys.executable, "-c",
+            "import os, sys, venv_tools; "
+            "teardown = venv_tools.BackgroundTeardown(workers=2); "
+            "[teardown.remove(os.path.join(sys.argv[1], name)) "
+            "for name in os.listdir(sys.argv[1])]",
+            self.parent,
+        ], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(os.listdir(self.parent), [])
+
+    def test_temporary_venv(self):
+        with BackgroundTeardown() as teardown:
+            with TemporaryVenv(teardown=teardown) as env_dir:
+                self.assertTrue(is_venv(env_dir))
+            self.assertFalse(os.path.exists(env_dir))
+            teardown.flush()
+            self.assertEqual([
+                name for name in os.listdir(os.path.dirname(env_dir))
+                if os.path.basename(env_dir) in name
+            ], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.parent)
+
+
+class TestTemporaryVenvPlacement(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+
+    def test_dir(self):
+        with TemporaryVenv(
+            dir=self.base, prefix="pre-", suffix="-suf"
+        ) as env_dir:
+            self.assertEqual(os.path.dirname(env_dir), self.base)
+            self.assertTrue(os.path.basename(env_dir).startswith("pre-"))
+            self.assertTrue(env_dir.endswith("-suf"))
+            self.assertTrue(is_venv(env_dir))
+
+    def test_candidates(self):
+        missing = os.path.join(self.base, "missing")
+        with TemporaryVenv(dir=[missing, self.base]) as env_dir:
+            self.assertEqual(os.path.dirname(env_dir), self.base)
+
+    def test_free_space(self):
+        self.assertEqual(select_temp_dir([self.base], 1), self.base)
+        self.assertIsNone(select_temp_dir([self.base], 2**70))
+        with TemporaryVenv(dir=[self.base], min_free_space=2**70) as env_dir:
+            self.assertEqual(
+                os.path.dirname(env_dir), tempfile.gettempdir()
+            )
+
+    @unittest.skipIf(
+        select_temp_dir([TMPFS_DIR]) is None, "no usable tmpfs"
+    )
+    def test_tmpfs(self):
+        with TemporaryVenv(dir=self.base, use_tmpfs=True) as env_dir:
+            self.assertEqual(os.path.dirname(env_dir), TMPFS_DIR)
+            self.assertTrue(is_venv(env_dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.wheel_dir = tempfile.mkdtemp()
+        self.a1 = make_wheel(self.wheel_dir, "venv_tools_test_a", "1.0")
+        self.a2 = make_wheel(self.wheel_dir, "venv_tools_test_a", "2.0")
+        self.b = make_wheel(self.wheel_dir, "venv_tools_test_b", "1.0")
+
+    def version(self, venv):
+        return venv.call_python_code(
+            "import venv_tools_test_a as a; print(a.VERSION)"
+        ).stdout.strip()
+
+    def test_sync(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            result = venv.sync([self.a1, self.b])
+            self.assertEqual(
+                [r.name for r in result.installed],
+                ["venv-tools-test-a", "venv-tools-test-b"]
+            )
+            self.assertEqual(result.removed, [])
+
+            result = venv.sync([self.a1, self.b])
+            self.assertEqual(result.installed, [])
+            self.assertEqual(
+                result.unchanged, ["venv-tools-test-a", "venv-tools-test-b"]
+            )
+
+            events = []
+            add_listener(events.append)
+            try:
+                result = venv.sync([self.a2])
+            finally:
+                remove_listener(events.append)
+            self.assertEqual(
+                [r.name for r in result.installed], ["venv-tools-test-a"]
+            )
+            self.assertEqual(result.removed, ["venv-tools-test-b"])
+            self.assertEqual(
+                [event.kind for event in events
+                 if event.kind in ("install", "uninstall")],
+                ["install", "uninstall"]
+            )
+            self.assertEqual(self.version(venv), "2.0")
+            self.assertRaises(
+                subprocess.CalledProcessError, venv.call_python_code,
+                "import venv_tools_test_b"
+            )
+            venv.call_python_module("pip", "--version")
+
+    def test_requirements_file(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            result = venv.sync([
+                "# pinned by hand", "", self.a1 + "  # the first release",
+            ])
+            self.assertEqual(
+                [(r.requirement, r.version) for r in result.installed],
+                [(self.a1, "1.0")]
+            )
+            self.assertEqual(self.version(venv), "1.0")
+
+    def test_unnamed(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            self.assertRaises(RuntimeError, venv.sync, ["git+https://x/y.git"])
+            self.assertRaises(RuntimeError, venv.sync, ["-e ."])
+            self.assertRaises(
+                RuntimeError, venv.sync, ["--index-url https://x/simple"]
+            )
+
+    def test_requirement_pin(self):
+        self.assertEqual(requirement_pin("Foo_Bar==1.0"), ("foo-bar", "1.0"))
+        self.assertEqual(
+            requirement_pin("foo[x] == 1.0; python_version>'3'"),
+            ("foo", "1.0")
+        )
+        self.assertEqual(requirement_pin("foo>=1"), ("foo", None))
+        self.assertEqual(requirement_pin("foo==1.*"), ("foo", None))
+        self.assertEqual(requirement_pin(self.a1), ("venv-tools-test-a", "1.0"))
+        self.assertEqual(requirement_pin("foo @ https://x/y"), ("foo", None))
+        self.assertEqual(requirement_pin("git+https://x/y"), (None, None))
+        self.assertEqual(
+            requirement_pin("foo==1.0  # pinned"), ("foo", "1.0")
+        )
+        self.assertEqual(requirement_pin("# foo==1.0"), (None, None))
+        self.assertEqual(requirement_pin("-e ./foo"), (None, None))
+        self.assertEqual(
+            requirement_pin("--index-url https://x/simple"), (None, None)
+        )
+        self.assertEqual(
+            requirement_pin("git+https://x/y#egg=foo"), (None, None)
+        )
+        self.assertEqual(
+            strip_requirement_comment("https://x/foo.zip#egg=foo  # note"),
+            "https://x/foo.zip#egg=foo"
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.wheel_dir)
+
+
+class TestDistributions(unittest.TestCase):
+    def setUp(self):
+        clear_distributions_cache()
+        self.wheel_dir = tempfile.mkdtemp()
+        self.wheels = [
+            make_wheel(self.wheel_dir, "venv_tools_test_a", "1.0"),
+            make_wheel(self.wheel_dir, "venv_tools_test_a", "2.0"),
+        ]
+
+    def versions(self, venv):
+        return {dist.name: dist.version for dist in venv.distributions()}
+
+    def test_distributions(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            versions = self.versions(venv)
+            self.assertIn("pip", versions)
+            self.assertNotIn("venv_tools_test_a", versions)
+            pip_list = json.loads(venv.call_python_module(
+                "pip", "list", "--format=json", "--disable-pip-version-check"
+            ).stdout)
+            self.assertEqual(
+                versions, {dist["name"]: dist["version"] for dist in pip_list}
+            )
+
+            venv.install_packages(self.wheels[:1])
+            self.assertEqual(self.versions(venv)["venv_tools_test_a"], "1.0")
+            venv.install_packages(self.wheels[1:])
+            self.assertEqual(self.versions(venv)["venv_tools_test_a"], "2.0")
+
+    def test_cached(self):
+        with TemporaryVenv(with_pip=True) as envdir:
+            venv = Venv(envdir)
+            first = venv.distributions()
+            dist = first[0]
+            site_dir = os.path.dirname(dist.path)
+            with Metrics() as metrics:
+                self.assertEqual(read_distributions(site_dir), first)
+            self.assertIn(
+                'venv_tools_cache_requests_total{cache="distributions",'
+                'result="hit"} 1', metrics.render().splitlines()
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.wheel_dir)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Building minimal wheels, so installs can be tested and benchmarked offline.
+Shared by the tests and `benchmarks/bench_venv_tools.py`.
+
+:copyright: (c) 2014 by James Tocknell.
+:license: BSD, see LICENSE for more details.
+"""
+import os.path as pth
+import zipfile
+
+
+def make_wheel(directory, name, version):
+    """
+    Build a minimal pure python wheel of the module `name` in `directory`,
+    returning its path.
+    """
+    dist_info = "{}-{}.dist-info".format(name, version)
+    filename = pth.join(
+        directory, "{}-{}-py3-none-any.whl".format(name, version)
+    )
+    files = {
+        "{}.py".format(name): "VERSION = {!r}\n".format(version),
+        dist_info + "/METADATA": (
+            "Metadata-Version: 2.1\nName: {}\nVersion: {}\n".format(
+                name, version
+            )
+        ),
+        dist_info + "/WHEEL": (
+            "Wheel-Version: 1.0\nGenerator: venv_tools\n"
+            "Root-Is-Purelib: true\nTag: py3-none-any\n"
+        ),
+    }
+    with zipfile.ZipFile(filename, "w") as wheel:
+        for path, contents in files.items():
+            wheel.writestr(path, contents)
+        wheel.writestr(dist_info + "/RECORD", "".join(
+            "{},,\n".format(path) for path in list(files) + [
+                dist_info + "/RECORD"
+            ]
+        ))
+    return filename